@@ -42,6 +42,15 @@ def m1(state):
 gtpyhop.declare_task_methods('put_it',m_err,m0,m1)
 
 
+def m_put_any(state):
+    """A generator method that offers the same refinements as m_err, m0, m1"""
+    yield [('putv', 0), ('getv', 1)]
+    yield [('putv', 0), ('getv', 0)]
+    yield [('putv', 1), ('getv', 1)]
+
+gtpyhop.declare_task_methods('put_it_lazily',m_put_any)
+
+
 def m_need0(state):
     return [('getv', 0)]
 
@@ -129,4 +138,92 @@ solution it finds for 'put_it' doesn't satisfy the preconditions of the
 method for 'need1', making it backtrack to use a third method for 'put_it'.
 """)    
     result = gtpyhop.find_plan(state0,[('put_it',),('need1',)])
-    th.check_result(result,expect1)
\ No newline at end of file
+    th.check_result(result,expect1)
+    th.pause(do_pauses)
+
+    print("""'put_it_lazily' has a single method, m_put_any, which is a generator that
+yields the same three refinements as the methods for 'put_it'. seek_plan asks
+it for the next one each time it backtracks, so the result is the same.
+""")
+    result = gtpyhop.find_plan(state0,[('put_it_lazily',),('need1',)])
+    th.check_result(result,expect1)
+    th.pause(do_pauses)
+
+    print("""If 'put_it' is declared to be a committed task, seek_plan commits to the
+first applicable method for it, m_err, and can't backtrack to the others.
+So this time it fails. (We do this in a copy of the domain, so that the
+declaration doesn't affect the other examples.)
+""")
+    gtpyhop.current_domain = the_domain.copy('committed_backtracking_htn')
+    gtpyhop.declare_committed_tasks('put_it')
+    result = gtpyhop.find_plan(state0,[('put_it',),('need0',)])
+    th.check_result(result,False)
+    gtpyhop.current_domain = the_domain
+    th.pause(do_pauses)
+
+    print("""find_plan_lds does a limited discrepancy search: it looks for a plan that
+uses only the first applicable method for each task, then for one that deviates
+from that once, and so on. Here the plan needs the third method for 'put_it',
+which is two discrepancies, so it finds the plan in its third search.
+""")
+    result = gtpyhop.find_plan_lds(state0,[('put_it',),('need1',)])
+    th.check_result(result,expect1)
+    th.pause(do_pauses)
+
+    print("""With max_discrepancies=1, find_plan_lds gives up before its third search.
+""")
+    result = gtpyhop.find_plan_lds(state0,[('put_it',),('need1',)],max_discrepancies=1)
+    th.check_result(result,False)
+    th.pause(do_pauses)
+
+    print("""find_plan_restarts does a depth-first search that gives up after expanding
+'cutoff' nodes, and then restarts with a bigger or smaller limit, shuffling the
+methods for each task with a random number generator. Since the generator is
+seeded, the searches (and the plan) are the same every time this is run.
+""")
+    gtpyhop.verbose = 2
+    result = gtpyhop.find_plan_restarts(state0,[('put_it',),('need1',)],seed=0,cutoff=5)
+    th.check_result(result,expect1)
+    th.pause(do_pauses)
+
+    print("""find_plan_anytime keeps looking for cheaper plans after it finds one. Below,
+('putv', 0) costs 3, and every other action costs 1 (the default). The first
+plan uses m0 and costs 5; find_plan_anytime yields it, and then it finds the
+plan that uses m1, which costs 3. (Again we use a copy of the domain.)
+""")
+    gtpyhop.verbose = 1
+    gtpyhop.current_domain = the_domain.copy('costly_backtracking_htn')
+    gtpyhop.declare_action_cost('putv', lambda state, flag_val: 3 if flag_val == 0 else 1)
+    results = list(gtpyhop.find_plan_anytime(state0,[('put_it',),('need01',)]))
+    th.check_result(results,[(expect0,5),(expect1,3)])
+    gtpyhop.current_domain = the_domain
+    th.pause(do_pauses)
+
+    print("""find_plan_stream yields each action as soon as backtracking can no longer
+undo it. Below, the actions come out once m1, the last method for 'put_it',
+has been chosen. If there is no plan, the last thing it yields is False.
+""")
+    gtpyhop.verbose = 2
+    results = list(gtpyhop.find_plan_stream(state0,[('put_it',),('need1',)]))
+    th.check_result(results,expect1)
+    gtpyhop.verbose = 1
+    results = list(gtpyhop.find_plan_stream(state0,[('put_it',),('need0',),('need1',)]))
+    th.check_result(results,[('putv', 1), ('getv', 1), False])
+    th.pause(do_pauses)
+
+    print("""A planner with a MethodStats object learns which methods tend to work, and
+tries them first. After it has planned for 'need1' twice, it tries m1 first.
+With frozen=True, it uses the statistics without changing them, so that
+later runs try the methods in the same order.
+""")
+    stats = gtpyhop.MethodStats()
+    planner = gtpyhop.Planner(verbose=0, method_stats=stats)
+    planner.find_plan(state0,[('put_it',),('need1',)])
+    planner.find_plan(state0,[('put_it',),('need1',)])
+    print('put_it statistics:', {m:c for ((t,m),c) in stats.counts.items() if t == 'put_it'})
+    methods = stats.order('put_it', the_domain._task_method_dict['put_it'])
+    th.check_result([m.__name__ for m in methods],['m1', 'm_err', 'm0'])
+    stats.frozen = True
+    gtpyhop.verbose = 3
+    result = gtpyhop.Planner(method_stats=stats).find_plan(state0,[('put_it',),('need1',)])
+    th.check_result(result,expect1)
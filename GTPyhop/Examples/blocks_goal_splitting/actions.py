@@ -13,12 +13,20 @@ how methods are defined for Python classes (where the first argument is
 always the name of the class instance). For example, the function
 pickup(s,b) implements the action ('pickup', b).
 
-The blocks-world actions use three state variables:
+The blocks-world actions use four state variables:
 - pos[b] = block b's position, which may be 'table', 'hand', or another block.
 - clear[b] = False if a block is on b or the hand is holding b, else True.
 - holding['hand'] = name of the block being held, or False if 'hand' is empty.
+- above[b] = the block that is on b, or False if there isn't one. This is
+  the inverse of pos; it lets methods find the block on b without searching.
 """
 
+def above_from_pos(pos):
+    """Return the 'above' state variable that corresponds to 'pos'"""
+    above = {b: False for b in pos}
+    above.update({b2: b1 for (b1, b2) in pos.items() if b2 not in ('table', 'hand')})
+    return above
+
 def pickup(s,x):
     if s.pos[x] == 'table' and s.clear[x] == True and s.holding['hand'] == False:
         s.pos[x] = 'hand'
@@ -32,6 +40,7 @@ def unstack(s,b1,b2):
         s.clear[b1] = False
         s.holding['hand'] = b1
         s.clear[b2] = True
+        s.above[b2] = False
         return s
     
 def putdown(s,b1):
@@ -47,6 +56,7 @@ def stack(s,b1,b2):
         s.clear[b1] = True
         s.holding['hand'] = False
         s.clear[b2] = False
+        s.above[b2] = b1
         return s
 
 
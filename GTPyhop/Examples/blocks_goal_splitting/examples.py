@@ -43,6 +43,7 @@ def main(do_pauses=True):
     state1.pos={'a':'b', 'b':'table', 'c':'table'}
     state1.clear={'c':True, 'b':False,'a':True}
     state1.holding={'hand':False}
+    state1.above={'a':False, 'b':'a', 'c':False}
 
     state1.display('\nInitial state is')
 
@@ -97,6 +98,7 @@ of the conditions in goal2a, but both goals should produce the same plan.
     state2.pos={'a':'c', 'b':'d', 'c':'table', 'd':'table'}
     state2.clear={'a':True, 'c':False,'b':True, 'd':False}
     state2.holding={'hand':False}
+    state2.above={'a':False, 'b':False, 'c':'a', 'd':'b'}
 
     state2.display('The initial state is')
     
@@ -144,6 +146,7 @@ Define problem bw_large_d from the SHOP distribution.
     state3.clear = {x:False for x in range(1,20)}
     state3.clear.update({1:True, 11:True, 9:True, 19:True})
     state3.holding={'hand':False}
+    state3.above=above_from_pos(state3.pos)
 
     state3.display('The initial state is')
     
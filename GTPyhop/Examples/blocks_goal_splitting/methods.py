@@ -73,8 +73,7 @@ def m_make_clear(state,b2,truth):
         if b2 == 'table' or state.clear[b2]:
             return []
         else:
-            # the block above b2
-            above_b2 = [b1 for b1 in state.pos if state.pos[b1] == b2][0]
+            above_b2 = state.above[b2]
             return [('clear',above_b2,True), ('pos',above_b2,'table')]
 
 gtpyhop.declare_unigoal_methods('clear',m_make_clear)
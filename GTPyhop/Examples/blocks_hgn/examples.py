@@ -45,6 +45,7 @@ def main(do_pauses=True):
     state1.pos={'a':'b', 'b':'table', 'c':'table'}
     state1.clear={'c':True, 'b':False,'a':True}
     state1.holding={'hand':False}
+    state1.above={'a':False, 'b':'a', 'c':False}
 
     state1.display('Initial state is')
 
@@ -124,6 +125,7 @@ Run find_plan on the famous Sussman anomaly.
     sus_s0.pos={'a':'table', 'b':'table', 'c':'a'}
     sus_s0.clear={'a':False,'b':True, 'c':True}
     sus_s0.holding={'hand':False}
+    sus_s0.above={'a':'c', 'b':False, 'c':False}
 
     sus_s0.display()
     
@@ -148,6 +150,7 @@ of the conditions in goal2a, but both goals should produce the same plan.
     state2.pos={'a':'c', 'b':'d', 'c':'table', 'd':'table'}
     state2.clear={'a':True, 'c':False,'b':True, 'd':False}
     state2.holding={'hand':False}
+    state2.above={'a':False, 'b':False, 'c':'a', 'd':'b'}
 
     state2.display('Initial state is')
     
@@ -183,6 +186,7 @@ of the conditions in goal2a, but both goals should produce the same plan.
     state3.clear = {x:False for x in range(1,20)}
     state3.clear.update({1:True, 11:True, 9:True, 19:True})
     state3.holding={'hand':False}
+    state3.above=above_from_pos(state3.pos)
 
     state3.display('Initial state is')
     
@@ -215,6 +219,7 @@ of the conditions in goal2a, but both goals should produce the same plan.
     IPC2011BWrand50.clear = {x:False for x in range(1,50)}
     IPC2011BWrand50.clear.update({7:True, 10:True, 12:True, 13:True, 23:True})
     IPC2011BWrand50.holding = {'hand':False}
+    IPC2011BWrand50.above = above_from_pos(IPC2011BWrand50.pos)
      
     IPC2011BWrand50.display('Initial state is')
 
@@ -45,6 +45,7 @@ def main(do_pauses=True):
     state1.pos={'a':'b', 'b':'table', 'c':'table'}
     state1.clear={'c':True, 'b':False,'a':True}
     state1.holding={'hand':False}
+    state1.above={'a':False, 'b':'a', 'c':False}
 
     state1.display('Initial state is')
 
@@ -131,6 +132,7 @@ Run find_plan on the famous Sussman anomaly.
     sus_s0.pos={'c':'a', 'a':'table', 'b':'table'}
     sus_s0.clear={'c':True, 'a':False,'b':True}
     sus_s0.holding={'hand':False}
+    sus_s0.above={'a':'c', 'b':False, 'c':False}
 
     sus_s0.display()
     
@@ -155,6 +157,7 @@ Another initial state and two multigoals, goal2a and goal2b, such that
     state2.pos={'a':'c', 'b':'d', 'c':'table', 'd':'table'}
     state2.clear={'a':True, 'c':False,'b':True, 'd':False}
     state2.holding={'hand':False}
+    state2.above={'a':False, 'b':False, 'c':'a', 'd':'b'}
 
     state2.display('Initial state is')
     
@@ -195,6 +198,7 @@ Another initial state and two multigoals, goal2a and goal2b, such that
     state3.clear = {x:False for x in range(1,20)}
     state3.clear.update({1:True, 11:True, 9:True, 19:True})
     state3.holding={'hand':False}
+    state3.above=above_from_pos(state3.pos)
 
     state3.display('Initial state is')
     
@@ -227,6 +231,7 @@ Another initial state and two multigoals, goal2a and goal2b, such that
     IPC2011BWrand50.clear = {x:False for x in range(1,50)}
     IPC2011BWrand50.clear.update({7:True, 10:True, 12:True, 13:True, 23:True})
     IPC2011BWrand50.holding = {'hand':False}
+    IPC2011BWrand50.above = above_from_pos(IPC2011BWrand50.pos)
      
     IPC2011BWrand50.display('Initial state is')
 
@@ -248,6 +253,50 @@ Another initial state and two multigoals, goal2a and goal2b, such that
     th.check_result(plan,expected)
     th.pause(do_pauses)
 
+    print("""
+Do it again, from a copy of the state that keeps a hash (see State.track_hash).
+The plan should be the same, and the hash should be the same as the one that
+state_key() computes from scratch for the original state:
+""")
+
+    tracked_state = IPC2011BWrand50.copy().track_hash()
+    plan = gtpyhop.find_plan(tracked_state,[('achieve', IPC2011BWrand50Goal)])
+    th.check_result(plan,expected)
+    th.check_result(tracked_state.state_key(),IPC2011BWrand50.state_key())
+    th.pause(do_pauses)
+
+    print("""
+A list state variable's hash depends on the order of its members, so sorting
+or reversing it in place must update the hash. After each change, state_key()
+should be the same as for a new state with the same list:
+""")
+
+    listed = gtpyhop.State('listed', order=[3, 1, 2]).track_hash()
+    listed.order.sort()
+    th.check_result(listed.state_key(), gtpyhop.State('fresh', order=[1, 2, 3]).state_key())
+    listed.order.reverse()
+    th.check_result(listed.state_key(), gtpyhop.State('fresh', order=[3, 2, 1]).state_key())
+    th.check_result(listed == gtpyhop.State('fresh', order=[3, 2, 1]).track_hash(), True)
+    th.pause(do_pauses)
+
+    print("""
+Plan for it twice more, with a planner that has a method cache (see
+gtpyhop.MethodCache). m_take and m_put have declared read-sets (see
+declare_method_reads), so the planner remembers what they returned, and
+the second time it finds all of their calls in the cache:
+""")
+
+    cache = gtpyhop.MethodCache()
+    planner = gtpyhop.Planner(verbose=0, method_cache=cache)
+    plan = planner.find_plan(tracked_state,[('achieve', IPC2011BWrand50Goal)])
+    th.check_result(plan,expected)
+    misses = cache.misses
+    plan = planner.find_plan(tracked_state,[('achieve', IPC2011BWrand50Goal)])
+    th.check_result(plan,expected)
+    print(cache, f"hit rate {cache.hit_rate():.2f}")
+    th.check_result(cache.misses,misses)
+    th.pause(do_pauses)
+
     print("""
 Call run_lazy_lookahead on the following problem, with verbose=1:
 """)
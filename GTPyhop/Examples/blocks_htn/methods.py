@@ -126,4 +126,9 @@ def m_put(state,b1,b2):
 
 gtpyhop.declare_task_methods('put',m_put)
 
+# m_take and m_put look only at these state variables, so a planner with a
+# method cache (see gtpyhop.method_cache) can reuse what they return.
+gtpyhop.declare_method_reads(m_take,'clear','pos')
+gtpyhop.declare_method_reads(m_put,'holding')
+
 
@@ -4,6 +4,16 @@ This file is based on the logistics-domain examples included with HGNpyhop:
 For a discussion of the adaptations that were needed, see the relevant
 section of Some_GTPyhop_Details.md in the top-level directory.
 -- Dana Nau <nau@umd.edu>, July 20, 2021
+
+Besides the state variables at, truck_at, plane_at and in_city, a state
+has indexes that the methods use instead of scanning the whole fleet:
+  - trucks_in[c] is the frozenset of trucks in city c
+  - planes_in[c] is the frozenset of airplanes at city c's airport
+  - airport_of[c] is city c's airport
+add_indexes(state) computes them, and the actions keep them up to date by
+replacing the frozensets rather than changing them in place, so that states
+that keep a hash (see gtpyhop.State.track_hash) can update it.
+generate_problem(...) creates random instances of any size.
 """
 
 
@@ -14,6 +24,7 @@ import sys
 sys.path.append('../')
 import gtpyhop
 
+import random
 import test_harness as th   # code for use in paging and debugging
 
 # Rather than hard-coding the domain name, use the name of the current file.
@@ -26,6 +37,10 @@ the_domain = gtpyhop.Domain(domain_name)
 # Actions
 
 def drive_truck(state, t, l):
+        old_city, new_city = state.in_city[state.truck_at[t]], state.in_city[l]
+        if old_city != new_city:
+            state.trucks_in[old_city] = state.trucks_in[old_city] - {t}
+            state.trucks_in[new_city] = state.trucks_in[new_city] | {t}
         state.truck_at[t] = l
         return state
 
@@ -43,6 +58,9 @@ def unload_truck(state, o, l):
 
 
 def fly_plane(state, plane, a):
+        old_city, new_city = state.in_city[state.plane_at[plane]], state.in_city[a]
+        state.planes_in[old_city] = state.planes_in[old_city] - {plane}
+        state.planes_in[new_city] = state.planes_in[new_city] | {plane}
         state.plane_at[plane] = a
         return state
 
@@ -68,26 +86,33 @@ gtpyhop.declare_actions(drive_truck, load_truck, unload_truck, fly_plane, load_p
 
 # Find a truck in the same city as the package
 def find_truck(state, o):
-    for t in state.trucks:
-        if state.in_city[state.truck_at[t]] == state.in_city[state.at[o]]:
-            return t
-    return False
+    trucks = state.trucks_in[state.in_city[state.at[o]]]
+    return min(trucks) if trucks else False
 
 
-# Find a plane in the same city as the package; if none available, find a random plane
+# Find a plane in the same city as the package; if none available, find any plane
 def find_plane(state, o):
-    for plane in state.airplanes:
-        if state.in_city[state.plane_at[plane]] == state.in_city[state.at[o]]:
-            return plane
-    return plane
+    planes = state.planes_in[state.in_city[state.at[o]]]
+    return min(planes) if planes else min(state.airplanes)
 
 
 # Find an airport in the same city as the location
 def find_airport(state, l):
-    for a in state.airports:
-        if state.in_city[a] == state.in_city[l]:
-            return a
-    return False
+    return state.airport_of.get(state.in_city[l], False)
+
+
+def add_indexes(state):
+    """Compute state's trucks_in, planes_in and airport_of indexes from its other state variables"""
+    trucks_in = {c: set() for c in state.cities}
+    for t in state.trucks:
+        trucks_in[state.in_city[state.truck_at[t]]].add(t)
+    state.trucks_in = {c: frozenset(trucks) for (c, trucks) in trucks_in.items()}
+    planes_in = {c: set() for c in state.cities}
+    for plane in state.airplanes:
+        planes_in[state.in_city[state.plane_at[plane]]].add(plane)
+    state.planes_in = {c: frozenset(planes) for (c, planes) in planes_in.items()}
+    state.airport_of = {state.in_city[a]: a for a in state.airports}
+    return state
 
 
 ################################################################################
@@ -133,7 +158,7 @@ gtpyhop.declare_unigoal_methods('plane_at', m_fly_plane)
 
 
 def move_within_city(state, o, l):
-    if o in state.packages and state.at[o] in state.locations and state.in_city[state.at[o]] == state.in_city[l]:
+    if o in state.packages and state.at[o] in state.locations and l in state.locations and state.in_city[state.at[o]] == state.in_city[l]:
         t = find_truck(state, o)
         if t:
             return [('truck_at', t, state.at[o]), ('at', o, t), ('truck_at', t, l), ('at', o, l)]
@@ -149,7 +174,7 @@ def move_between_airports(state, o, a):
 
 
 def move_between_city(state, o, l):
-    if o in state.packages and state.at[o] in state.locations and state.in_city[state.at[o]] != state.in_city[l]:
+    if o in state.packages and state.at[o] in state.locations and l in state.locations and state.in_city[state.at[o]] != state.in_city[l]:
         a1 = find_airport(state, state.at[o])
         a2 = find_airport(state, l)
         if a1 and a2:
@@ -160,6 +185,70 @@ def move_between_city(state, o, l):
 gtpyhop.declare_unigoal_methods('at', move_within_city, move_between_airports, move_between_city)
 
 
+################################################################################
+# A heuristic for find_plan_best_first
+
+
+def h_packages_not_delivered(state, todo_list):
+    """
+    Each package o that has a goal ('at', o, l) in todo_list that isn't
+    achieved needs at least an unload action, and a load action too if it
+    isn't in a vehicle. A package is counted once, even if it has several
+    such goals (e.g., the ones that move_between_city adds), so the result
+    is a lower bound on the number of actions that remain.
+    """
+    packages = {item[1] for item in todo_list
+                if isinstance(item, tuple) and item[0] == 'at' and state.at[item[1]] != item[2]}
+    return sum(2 if state.at[o] in state.locations else 1 for o in packages)
+
+
+gtpyhop.declare_heuristic(h_packages_not_delivered)
+
+
+################################################################################
+# Random problems
+
+
+def generate_problem(cities, locations_per_city=3, trucks_per_city=1, airplanes=None, packages=10, seed=0):
+    """
+    Return (state, goals) for a random logistics problem. Each city has an
+    airport and locations_per_city other locations, and trucks_per_city
+    trucks; there are 'airplanes' airplanes (by default, one per ten cities)
+    at random airports. Each of the 'packages' packages starts at a random
+    location, and the goals are to move it to a random location elsewhere.
+    The same arguments always produce the same problem.
+    """
+    rng = random.Random(seed)
+    if airplanes is None:
+        airplanes = max(1, cities // 10)
+    state = gtpyhop.State(f'logistics_{cities}_{packages}_{seed}')
+    state.cities = {f'city{i}' for i in range(cities)}
+    state.airports = {f'airport{i}' for i in range(cities)}
+    state.in_city = {}
+    city_locations = []
+    for i in range(cities):
+        here = [f'airport{i}'] + [f'location{i}_{j}' for j in range(locations_per_city)]
+        city_locations.append(here)
+        state.in_city.update({l: f'city{i}' for l in here})
+    state.locations = set(state.in_city)
+    state.trucks = set()
+    state.truck_at = {}
+    for i in range(cities):
+        for k in range(trucks_per_city):
+            state.trucks.add(f'truck{i}_{k}')
+            state.truck_at[f'truck{i}_{k}'] = rng.choice(city_locations[i])
+    state.airplanes = {f'plane{k}' for k in range(airplanes)}
+    state.plane_at = {f'plane{k}': f'airport{rng.randrange(cities)}' for k in range(airplanes)}
+    state.packages = {f'package{k}' for k in range(packages)}
+    state.at = {}
+    goals = []
+    for k in range(packages):
+        start, goal = rng.sample([l for here in city_locations for l in here], 2)
+        state.at[f'package{k}'] = start
+        goals.append(('at', f'package{k}', goal))
+    return add_indexes(state), goals
+
+
 ################################################################################
 # Examples
 
@@ -201,6 +290,7 @@ def main(do_pauses=True):
                       'airport1': 'city1',
                       'location10': 'city2',
                       'airport2': 'city2'}
+    add_indexes(state1)
 
     gtpyhop.verbose = 3
 
@@ -211,7 +301,11 @@ def main(do_pauses=True):
     Goal 1: package1 is at location2; package2 is at location3 (transport within the same city)
     ----------
     """)
-    gtpyhop.find_plan(state1, [('at', 'package1', 'location2'), ('at', 'package2', 'location3')])
+    result = gtpyhop.find_plan(state1, [('at', 'package1', 'location2'), ('at', 'package2', 'location3')])
+    th.check_result(result, [('drive_truck', 'truck1', 'location1'), ('load_truck', 'package1', 'truck1'),
+        ('drive_truck', 'truck1', 'location2'), ('unload_truck', 'package1', 'location2'),
+        ('load_truck', 'package2', 'truck1'), ('drive_truck', 'truck1', 'location3'),
+        ('unload_truck', 'package2', 'location3')])
 
     th.pause(do_pauses)
 
@@ -220,7 +314,31 @@ def main(do_pauses=True):
     Goal 2: package1 is at location10 (transport to a different city)
     ----------
     """)
-    gtpyhop.find_plan(state1, [('at', 'package1', 'location10')])
+    result = gtpyhop.find_plan(state1, [('at', 'package1', 'location10')])
+    th.check_result(result, [('drive_truck', 'truck1', 'location1'), ('load_truck', 'package1', 'truck1'),
+        ('drive_truck', 'truck1', 'airport1'), ('unload_truck', 'package1', 'airport1'),
+        ('fly_plane', 'plane2', 'airport1'), ('load_plane', 'package1', 'plane2'),
+        ('fly_plane', 'plane2', 'airport2'), ('unload_plane', 'package1', 'airport2'),
+        ('drive_truck', 'truck6', 'airport2'), ('load_truck', 'package1', 'truck6'),
+        ('drive_truck', 'truck6', 'location10'), ('unload_truck', 'package1', 'location10')])
+
+    th.pause(do_pauses)
+
+    print("""
+    ----------
+    Goal 2 again, with find_plan_best_first and the heuristic h_packages_not_delivered.
+    Refining ('at', o, a) with move_between_city when o is at another airport
+    gives the same goal again in the same state, and since refinements cost
+    nothing and the heuristic never overestimates, the search would keep
+    choosing that branch; detect_cycles makes it backtrack instead.
+    ----------
+    """)
+    gtpyhop.verbose = 1
+    gtpyhop.detect_cycles = True
+    best_first_result = gtpyhop.find_plan_best_first(state1, [('at', 'package1', 'location10')])
+    th.check_result(best_first_result, result)
+    gtpyhop.detect_cycles = False
+    gtpyhop.verbose = 3
 
     th.pause(do_pauses)
 
@@ -229,6 +347,22 @@ def main(do_pauses=True):
     Goal 3: package1 is at location1 (no actions needed)
     ----------
     """)
-    gtpyhop.find_plan(state1, [('at', 'package1', 'location1')])
+    result = gtpyhop.find_plan(state1, [('at', 'package1', 'location1')])
+    th.check_result(result, [])
+
+    th.pause(do_pauses)
+
+    print("""
+    ----------
+    Goal 4: a random problem with 200 cities, 5 trucks per city, and 5 packages
+    ----------
+    """)
+    gtpyhop.verbose = 1
+    state2, goals = generate_problem(200, trucks_per_city=5, packages=5, seed=1)
+    result = gtpyhop.find_plan(state2, goals)
+    # Execute the plan, to check that it achieves the goals
+    for action in result:
+        state2 = the_domain._action_dict[action[0]](state2.copy(), *action[1:])
+    th.check_result({o: state2.at[o] for (_, o, l) in goals}, {o: l for (_, o, l) in goals})
 
     print("No more examples")
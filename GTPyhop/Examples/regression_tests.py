@@ -16,6 +16,7 @@ import blocks_gtn; blocks_gtn.main(False)
 import blocks_goal_splitting; blocks_goal_splitting.main(False)
 import blocks_hgn; blocks_hgn.main(False)
 import blocks_htn; blocks_htn.main(False)
+import synthetic_htn; synthetic_htn.main(False)
 import pyhop_simple_travel_example
 import simple_htn_acting_error
 print('\nFinished without error.')
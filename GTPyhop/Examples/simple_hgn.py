@@ -199,6 +199,25 @@ gtpyhop.declare_unigoal_methods('loc',travel_by_foot,travel_by_taxi)
 gtpyhop.declare_multigoal_methods(gtpyhop.m_split_multigoal)
 
 
+###############################################################################
+# A domain with a badly ordered list of unigoal methods
+
+home = {'alice':'home_a', 'bob':'home_b'}
+
+def travel_via_home(state,p,y):
+    """Go to y by going home first"""
+    if is_a(p,'person') and is_a(y,'location'):
+        return [('loc',p,home[p]), ('loc',p,y)]
+
+# In this domain, travel_via_home is tried first. If p is already at home,
+# then its refinement pursues the goal (loc p y) again in the same state, and
+# so on forever, unless the planner's detect_cycles setting is True.
+loop_domain = gtpyhop.Domain(f'{domain_name}_loop')
+gtpyhop.declare_actions(walk, call_taxi, ride_taxi, pay_driver)
+gtpyhop.declare_unigoal_methods('loc',travel_via_home,travel_by_foot,travel_by_taxi)
+gtpyhop.current_domain = the_domain
+
+
 ###############################################################################
 # Running the examples
 
@@ -317,6 +336,18 @@ method has achieved all of the values specified in the multigoal.
     plan = gtpyhop.find_plan(new_state,[('loc','alice','park')])
     th.check_result(plan,[])
 
+    th.pause(do_pauses)
+    print(f"""
+In {loop_domain.__name__}, travel_via_home is the first method for 'loc'.
+Since Alice is at home, its refinement of ('loc','alice','park') pursues
+('loc','alice','park') again in the same state. With detect_cycles=True,
+the planner notices this and backtracks to the next method, instead of
+looping forever. Below, verbose=3:
+""")
+    planner = gtpyhop.Planner(loop_domain, verbose=3, detect_cycles=True)
+    plan = planner.find_plan(state1.copy().track_hash(),[('loc','alice','park')])
+    th.check_result(plan,expected)
+
     print("No more examples")
 
 
@@ -246,8 +246,9 @@ Find a plan that will first get Alice to the park, then get Bob to the park.
 
     print("""
 Next, we'll use run_lazy_lookahead to try to get Alice to the park. With
-Pr = 1/2, the taxi won't arrive. In this case, run_lazy_lookahead will call
-find_plan again, and find_plan will return the same plan as before. This will
+Pr = 1/2, the taxi won't arrive. In this case, run_lazy_lookahead will look
+for a new refinement of the task that the failed action came from, which is
+the travel task, and will get the same refinement as before. This will
 happen repeatedly until either the taxi arrives or run_lazy_lookahead decides
 it has tried too many times.""")
     th.pause(do_pauses)
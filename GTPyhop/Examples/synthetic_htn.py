@@ -0,0 +1,160 @@
+"""
+A generator of synthetic planning domains and problems, for stress-testing
+GTPyhop rather than for modeling anything. Each call to make_problem creates
+a new domain whose task network is a complete tree:
+  - the root task is ('t', 0, 0), and a task ('t', node, level) above the
+    bottom level has 'branching' methods, each of which decomposes it into
+    'subtasks' tasks at level+1;
+  - each method except the last fails with probability 'failure_prob', in
+    which case it returns an action ('fail', node) that is never applicable,
+    so the planner has to backtrack to the next method;
+  - a task at the bottom level (a leaf) becomes either the action
+    ('write', i, value) or the unigoal ('val', i, value), the latter with
+    probability 'unigoal_fraction'. Both write value into 'write_size'
+    consecutive entries of state.val, starting at i;
+  - the state has one state variable, val, with 'state_size' entries.
+All random choices are made when the domain is created, from 'seed', so a
+problem is the same every time it is generated, and its solution plan is
+known in advance. The domains are named synthetic_htn_0, synthetic_htn_1, ...
+"""
+
+# kludge to make gtpyhop available regardless of whether the current directory
+# is the Examples directory or its parent (where gtpyhop.py is located)
+#
+import sys
+sys.path.append('../')
+import gtpyhop
+
+import asyncio
+import random
+import test_harness as th   # code for use in paging and debugging
+
+
+_next_synthetic_number = 0
+
+
+def tree_size(depth, subtasks):
+    """The number of tasks in a task tree of the given depth and fan-out"""
+    return sum(subtasks ** level for level in range(depth + 1))
+
+
+def make_problem(branching=2, depth=4, subtasks=2, failure_prob=0.0,
+                 state_size=10, write_size=1, unigoal_fraction=0.0, seed=0):
+    """
+    Create (and make current) a synthetic domain with the given parameters,
+    described at the top of this file. Return (domain, state, todo_list,
+    expected_plan), where expected_plan is the plan find_plan should return.
+    """
+    global _next_synthetic_number
+    domain = gtpyhop.Domain(f'synthetic_htn_{_next_synthetic_number}')
+    _next_synthetic_number += 1
+    rng = random.Random(seed)
+    first_leaf = tree_size(depth - 1, subtasks) if depth > 0 else 0
+    number_of_tasks = tree_size(depth, subtasks)
+
+    # fails[node][j] says whether method j fails for the task at node
+    fails = [[rng.random() < failure_prob for j in range(branching - 1)] + [False]
+             for node in range(number_of_tasks)]
+    # the action or unigoal that each leaf becomes
+    leaves = {}
+    for node in range(first_leaf, number_of_tasks):
+        name = 'val' if rng.random() < unigoal_fraction else 'write'
+        leaves[node] = (name, rng.randrange(state_size), node + 1)
+
+    ############################################################################
+    # Actions
+
+    def write(state, i, value):
+        for k in range(write_size):
+            state.val[(i + k) % state_size] = value
+        return state
+
+    def fail(state, node):
+        return False
+
+    gtpyhop.declare_actions(write, fail)
+
+    ############################################################################
+    # Methods
+
+    def make_method(j):
+        def method(state, node, level):
+            if fails[node][j]:
+                return [('fail', node)]
+            if level == depth:
+                return [leaves[node]]
+            first_child = node * subtasks + 1
+            return [('t', child, level + 1) for child in range(first_child, first_child + subtasks)]
+        method.__name__ = f'm_t_{j}'
+        return method
+
+    gtpyhop.declare_task_methods('t', *[make_method(j) for j in range(branching)])
+
+    def m_write_val(state, i, value):
+        return [('write', i, value)]
+
+    gtpyhop.declare_unigoal_methods('val', m_write_val)
+
+    ############################################################################
+    # Problem
+
+    state = gtpyhop.State(f'{domain.__name__}_state0', val={i: 0 for i in range(state_size)})
+    expected_plan = [('write', i, value) for (name, i, value) in
+                     (leaves[node] for node in range(first_leaf, number_of_tasks))]
+    return domain, state, [('t', 0, 0)], expected_plan
+
+
+###############################################################################
+# Running the examples
+
+print('-----------------------------------------------------------------------')
+print(f"Created the module '{__name__}'. To run the examples, type this:")
+print(f"{__name__}.main()")
+
+def main(do_pauses=True):
+    """
+    Run various examples.
+    main() will pause occasionally to let you examine the output.
+    main(False) will run straight through to the end, without stopping.
+    """
+    gtpyhop.verbose = 1
+
+    print("A small synthetic domain with three methods per task, half of them failing:\n")
+    (domain, state, todo_list, expected) = make_problem(branching=3, depth=2, failure_prob=0.5,
+                                                        unigoal_fraction=0.5, seed=1)
+    gtpyhop.print_domain()
+    state.display(heading='Initial state is')
+    th.pause(do_pauses)
+
+    print("With verbose=2, the output shows the backtracking at each failed method:\n")
+    gtpyhop.verbose = 2
+    result = gtpyhop.find_plan(state, todo_list)
+    th.check_result(result, expected)
+    th.pause(do_pauses)
+
+    gtpyhop.verbose = 1
+    print("Larger problems, varying one parameter at a time:\n")
+    for parameters in [dict(depth=5, subtasks=2),
+                       dict(depth=3, subtasks=3, branching=4, failure_prob=0.7),
+                       dict(depth=4, state_size=200, write_size=20),
+                       dict(depth=4, unigoal_fraction=1.0)]:
+        print(f"make_problem({', '.join(f'{k}={v}' for k, v in parameters.items())}):")
+        (domain, state, todo_list, expected) = make_problem(**parameters)
+        result = gtpyhop.find_plan(state, todo_list)
+        th.check_result(result, expected)
+    th.pause(do_pauses)
+
+    print("""find_plan_async runs in an asyncio event loop, letting other tasks run
+every 100 node expansions, so the event loop can plan for several problems at
+once. The plans are the same as find_plan's:
+""")
+    problems = [make_problem(depth=5, failure_prob=0.3, seed=seed) for seed in range(3)]
+    planners = [gtpyhop.Planner(domain) for (domain, state, todo_list, expected) in problems]
+    async def plan_all():
+        return await asyncio.gather(*[planner.find_plan_async(state, todo_list)
+            for (planner, (domain, state, todo_list, expected)) in zip(planners, problems)])
+    results = asyncio.run(plan_all())
+    th.check_result(results, [expected for (domain, state, todo_list, expected) in problems])
+    th.pause(do_pauses)
+
+    print("No more examples")
@@ -17,7 +17,7 @@ of the modules in the Examples directory.
 # from IPython import embed
 # from IPython.terminal.debugger import set_trace
 
-import copy, sys, pprint, re
+import asyncio, copy, heapq, itertools, json, operator, os, sys, pprint, random, re, threading, time, types, warnings
 
 ################################################################################
 # How much information to print while the program is running
@@ -60,6 +60,11 @@ class State():
            s.loc['c'] = 'room3'
         Third:
            s = State('foo',loc={'b':'room2', 'c':'room3'})
+
+    Two states are equal (==) if they have the same state variables with the
+    same values; their names don't matter. s.track_hash() makes s keep a
+    64-bit hash of its state variables (see below), so that s.state_key()
+    usually takes constant time, and == can compare the hashes first.
     """
     
     def __init__(self, state_name, **kwargs):
@@ -76,6 +81,104 @@ class State():
     def __repr__(self):
         return _make_repr(self, 'State')
 
+    def __eq__(self, other):
+        if not isinstance(other, State):
+            return NotImplemented
+        z1 = vars(self).get('__zobrist__')
+        z2 = vars(other).get('__zobrist__')
+        # the hashes are only up to date if there are no mutable values inside
+        # the state variables' values, which may have been changed in place
+        if z1 and z2 and not z1[1] and not z2[1] and z1[0] != z2[0]:
+            return False
+        return _state_var_dict(self) == _state_var_dict(other)
+
+    # states can change, so they can't be dictionary keys; use state_key()
+    __hash__ = None
+
+    def __setattr__(self, name, value):
+        z = vars(self).get('__zobrist__')
+        if z is not None and name not in _NOT_STATE_VARS:
+            old = vars(self).get(name)
+            if old is not value or type(value) not in _HASHED_TYPES:
+                # (e.g. s.v += [x] assigns s.v's own value back to it)
+                if name in vars(self):
+                    z[0] -= _value_hash(name, old)
+                    z[1] -= _value_mutable(old)
+                    _detach(old)
+                value = _hashed_value(self, name, value)
+                z[0] = (z[0] + _value_hash(name, value)) & _MASK64
+                z[1] += _value_mutable(value)
+        vars(self)[name] = value
+
+    def __delattr__(self, name):
+        z = vars(self).get('__zobrist__')
+        if z is not None and name not in _NOT_STATE_VARS:
+            old = vars(self)[name]
+            z[0] = (z[0] - _value_hash(name, old)) & _MASK64
+            z[1] -= _value_mutable(old)
+            _detach(old)
+        del vars(self)[name]
+
+    def __deepcopy__(self, memo):
+        the_copy = type(self).__new__(type(self))
+        memo[id(self)] = the_copy
+        for (name, value) in vars(self).items():
+            vars(the_copy)[name] = copy.deepcopy(value, memo)
+        return the_copy
+
+    def __reduce_ex__(self, protocol):
+        if '__zobrist__' not in vars(self):
+            return object.__reduce_ex__(self, protocol)
+        # pickle the state variables as ordinary values, and track the hash again
+        return (_unpickle_tracked_state,
+                (self.__name__, {v: _plain_value(vars(self)[v]) for v in self.state_vars()}))
+
+    def track_hash(self):
+        """
+        Make the state keep a hash of its state variables, and return the
+        state. Copies of the state keep one too. The hash is the sum (mod
+        2**64) of a pseudo-random 64-bit number for each state-variable
+        binding (e.g., s.v[x] == y), so each change to the state updates it
+        in constant time:
+          - s.v[x] = y, del s.v[x], etc., where s.v is a dict;
+          - s.v[i] = x and s.v.append(x), where s.v is a list, and s.v.add(x),
+            etc., where s.v is a set (other changes to lists and sets, e.g.
+            s.v.extend(...) or s.v.sort(), take time proportional to the
+            length of s.v);
+          - s.v = value, which takes time proportional to the size of value.
+        Dicts, lists, and sets that are the values of state variables are
+        replaced by subclasses that do the updating.
+
+        Mutable objects inside them (e.g., the sets in s.v = {x: set()}) can
+        be changed in place without the hash finding out, so while a state
+        has any, state_key() computes the hash from scratch, and == doesn't
+        use it. To keep things fast, use immutable values instead (e.g.,
+        tuples or frozensets), or flat dicts such as s.v[(x, y)] = True.
+        """
+        z = [0, 0]
+        for name in self.state_vars():
+            value = vars(self)[name]
+            _detach(value)
+            value = _hashed_value(self, name, value)
+            vars(self)[name] = value
+            z[0] += _value_hash(name, value)
+            z[1] += _value_mutable(value)
+        z[0] &= _MASK64
+        vars(self)['__zobrist__'] = z
+        return self
+
+    def state_key(self):
+        """
+        Return a 64-bit hash of the state's state variables, which is the
+        same for equal states. If the state keeps a hash (see track_hash), and
+        no state variable's value contains mutable objects, this takes constant
+        time; otherwise it takes time proportional to the state's size.
+        """
+        z = vars(self).get('__zobrist__')
+        if z is not None and not z[1]:
+            return z[0]
+        return sum(_contribution(name, vars(self)[name]) for name in self.state_vars()) & _MASK64
+
     def copy(self,new_name=None):
         """
         Make a copy of the state. For its name, use new_name if it is given.
@@ -99,7 +202,7 @@ class State():
 
     def state_vars(self):
         """Return a list of all state-variable names in the state"""
-        return [v for v in vars(self) if v != '__name__']
+        return [v for v in vars(self) if v not in _NOT_STATE_VARS]
 
 
 # Sequence number to use when making copies of multigoals.
@@ -175,11 +278,322 @@ class Multigoal():
 def _make_repr(object, class_name):
     """Return a string that can be used to reconstruct the object"""
     x = f"{class_name}('{object.__name__}', "
-    x += ', '.join([f'{v}={vars(object)[v]}' for v in vars(object) if v != '__name__'])
+    x += ', '.join([f'{v}={vars(object)[v]}' for v in vars(object) if v not in _NOT_STATE_VARS])
     x += ')'
     return x
     
 
+# attributes of states and multigoals that aren't state variables;
+# '__zobrist__' is [hash, number of mutable values] for a state that keeps a
+# hash (see State.track_hash and _count_mutable)
+_NOT_STATE_VARS = {'__name__', '__zobrist__'}
+
+_MASK64 = (1 << 64) - 1
+
+
+def _state_var_dict(object):
+    """Return a dictionary of object's state variables and their values"""
+    return {v: val for (v, val) in vars(object).items() if v not in _NOT_STATE_VARS}
+
+
+# tags for the hashable forms that _canonical and _contribution build, so
+# that they can't be equal to any state-variable value
+_DICT_TAG = object()
+_LIST_TAG = object()
+_OTHER_TAG = object()
+_ELEMENT_TAG = object()
+_VALUE_TAG = object()
+
+
+def _canonical(value):
+    """
+    Return value if it is hashable, and otherwise a hashable equivalent of
+    it that is equal for values that are equal (e.g., for dicts whose items
+    are in different orders). So _canonical(value) is not value if and only
+    if value is, or contains, something mutable like a dict, list, or set.
+    """
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, dict):
+        return (_DICT_TAG, frozenset((arg, _canonical(val)) for (arg, val) in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, list):
+        return (_LIST_TAG, tuple(_canonical(x) for x in value))
+    if isinstance(value, tuple):
+        return tuple(_canonical(x) for x in value)
+    return (_OTHER_TAG, type(value), repr(value))
+
+
+# the pseudo-random number for each binding that a tracked state has had,
+# drawn the first time the binding is seen
+_zobrist_numbers = {}
+_zobrist_random = random.Random(0)
+
+
+def _zobrist(binding):
+    """
+    Return the pseudo-random 64-bit number for a binding, a hashable tuple.
+    Equal bindings get the same number, and different ones get independent
+    numbers (unlike Python's hash, for which e.g. hash(-1) == hash(-2)).
+    """
+    number = _zobrist_numbers.get(binding)
+    if number is None:
+        number = _zobrist_numbers.setdefault(binding, _zobrist_random.getrandbits(64))
+    return number
+
+
+def _contribution(name, value):
+    """What the state variable 'name' with value 'value' adds to a state's hash"""
+    if isinstance(value, dict):
+        return sum(_zobrist((name, arg, _canonical(val))) for (arg, val) in value.items()) & _MASK64
+    if isinstance(value, list):
+        return sum(_zobrist((name, _ELEMENT_TAG, i, _canonical(x)))
+                   for (i, x) in enumerate(value)) & _MASK64
+    if isinstance(value, set):
+        return sum(_zobrist((name, _ELEMENT_TAG, x)) for x in value) & _MASK64
+    return _zobrist((name, _VALUE_TAG, _canonical(value)))
+
+
+def _count_mutable(value):
+    """
+    The number of values in a dict, or members of a list, that are or contain
+    something mutable; for a value that isn't a dict, list, or set, 1 if it
+    contains something mutable and 0 otherwise
+    """
+    if isinstance(value, dict):
+        return sum(1 for val in value.values() if _canonical(val) is not val)
+    if isinstance(value, list):
+        return sum(1 for x in value if _canonical(x) is not x)
+    if isinstance(value, set):
+        return 0
+    return 0 if _canonical(value) is value else 1
+
+
+def _value_hash(name, value):
+    """
+    _contribution(name, value), but in constant time if value came from
+    _hashed_value, since it keeps its own hash
+    """
+    if type(value) in _HASHED_TYPES:
+        return value._hash
+    return _contribution(name, value)
+
+
+def _value_mutable(value):
+    """_count_mutable(value), but in constant time if value came from _hashed_value"""
+    if type(value) in _HASHED_TYPES:
+        return value._mutable
+    return _count_mutable(value)
+
+
+def _add_to_hash(value, amount, mutable=0):
+    """
+    Add amount to the hash of 'value' (see _hashed_value) and its state, and
+    'mutable' to their counts of mutable values
+    """
+    value._hash = (value._hash + amount) & _MASK64
+    value._mutable += mutable
+    state = value._state
+    if state is not None:
+        z = vars(state)['__zobrist__']
+        z[0] = (z[0] + amount) & _MASK64
+        z[1] += mutable
+
+
+def _hashed_value(state, name, value):
+    """
+    If value is a dict, list, or set, return a copy of it that updates
+    state's hash, and its own hash, when it changes; otherwise return value.
+    """
+    if isinstance(value, dict):
+        the_copy = _HashedDict()
+    elif isinstance(value, list):
+        the_copy = _HashedList()
+    elif isinstance(value, set):
+        the_copy = _HashedSet()
+    else:
+        return value
+    the_copy._state = state
+    the_copy._name = name
+    if isinstance(value, list):
+        list.extend(the_copy, value)
+    else:
+        type(the_copy).__bases__[0].update(the_copy, value)
+    the_copy._hash = _contribution(name, the_copy)
+    the_copy._mutable = _count_mutable(the_copy)
+    return the_copy
+
+
+def _detach(value):
+    """Make a value from _hashed_value that is no longer in its state stop updating the state"""
+    if type(value) in _HASHED_TYPES:
+        value._state = None
+
+
+def _plain_value(value):
+    """The inverse of _hashed_value"""
+    if type(value) in _HASHED_TYPES:
+        return type(value).__bases__[0](value)
+    return value
+
+
+def _unpickle_tracked_state(state_name, state_vars):
+    return State(state_name, **state_vars).track_hash()
+
+
+def _rehash_after(method):
+    """
+    Return a version of a dict, list, or set method that changes the value
+    of a state variable, which updates the hash of the state it's in.
+    """
+    def rehashing(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        _add_to_hash(self, _contribution(self._name, self) - self._hash,
+                     _count_mutable(self) - self._mutable)
+        return result
+    rehashing.__name__ = method.__name__
+    return rehashing
+
+
+class _HashedDict(dict):
+    """The value of a dict state variable in a state that keeps a hash"""
+    __slots__ = ('_state', '_name', '_hash', '_mutable')
+
+    def __setitem__(self, arg, val):
+        amount = mutable = 0
+        if arg in self:
+            old = dict.__getitem__(self, arg)
+            old_canonical = _canonical(old)
+            amount -= _zobrist((self._name, arg, old_canonical))
+            mutable -= old_canonical is not old
+        dict.__setitem__(self, arg, val)
+        canonical = _canonical(val)
+        _add_to_hash(self, amount + _zobrist((self._name, arg, canonical)),
+                     mutable + (canonical is not val))
+
+    def __delitem__(self, arg):
+        val = dict.__getitem__(self, arg)
+        dict.__delitem__(self, arg)
+        canonical = _canonical(val)
+        _add_to_hash(self, -_zobrist((self._name, arg, canonical)), -(canonical is not val))
+
+    def setdefault(self, arg, default=None):
+        if arg not in self:
+            self[arg] = default
+        return dict.__getitem__(self, arg)
+
+    def __deepcopy__(self, memo):
+        # a copy that belongs to a copy of the state, or if the state isn't
+        # being copied, an ordinary dict
+        the_copy = {} if id(self._state) not in memo else _HashedDict()
+        memo[id(self)] = the_copy
+        for (arg, val) in self.items():
+            dict.__setitem__(the_copy, copy.deepcopy(arg, memo), copy.deepcopy(val, memo))
+        if type(the_copy) is _HashedDict:
+            the_copy._state = memo[id(self._state)]
+            the_copy._name = self._name
+            the_copy._hash = self._hash
+            the_copy._mutable = self._mutable
+        return the_copy
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class _HashedList(list):
+    """The value of a list state variable in a state that keeps a hash"""
+    __slots__ = ('_state', '_name', '_hash', '_mutable')
+
+    def append(self, x):
+        list.append(self, x)
+        canonical = _canonical(x)
+        _add_to_hash(self, _zobrist((self._name, _ELEMENT_TAG, len(self) - 1, canonical)),
+                     canonical is not x)
+
+    # assigning to a slice can move members to other positions
+    _set_slice = _rehash_after(list.__setitem__)
+
+    def __setitem__(self, i, x):
+        if isinstance(i, slice):
+            return self._set_slice(i, x)
+        old = list.__getitem__(self, i)
+        list.__setitem__(self, i, x)
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        old_canonical = _canonical(old)
+        canonical = _canonical(x)
+        _add_to_hash(self, _zobrist((self._name, _ELEMENT_TAG, i, canonical))
+                     - _zobrist((self._name, _ELEMENT_TAG, i, old_canonical)),
+                     (canonical is not x) - (old_canonical is not old))
+
+    def __deepcopy__(self, memo):
+        the_copy = [] if id(self._state) not in memo else _HashedList()
+        memo[id(self)] = the_copy
+        list.extend(the_copy, [copy.deepcopy(x, memo) for x in self])
+        if type(the_copy) is _HashedList:
+            the_copy._state = memo[id(self._state)]
+            the_copy._name = self._name
+            the_copy._hash = self._hash
+            the_copy._mutable = self._mutable
+        return the_copy
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+class _HashedSet(set):
+    """The value of a set state variable in a state that keeps a hash"""
+    __slots__ = ('_state', '_name', '_hash', '_mutable')
+
+    def add(self, x):
+        if x not in self:
+            set.add(self, x)
+            _add_to_hash(self, _zobrist((self._name, _ELEMENT_TAG, x)))
+
+    def discard(self, x):
+        if x in self:
+            set.discard(self, x)
+            _add_to_hash(self, -_zobrist((self._name, _ELEMENT_TAG, x)))
+
+    def __repr__(self):
+        return set.__repr__(set(self))
+
+    def remove(self, x):
+        set.remove(self, x)
+        _add_to_hash(self, -_zobrist((self._name, _ELEMENT_TAG, x)))
+
+    def __deepcopy__(self, memo):
+        the_copy = set() if id(self._state) not in memo else _HashedSet()
+        memo[id(self)] = the_copy
+        set.update(the_copy, [copy.deepcopy(x, memo) for x in self])
+        if type(the_copy) is _HashedSet:
+            the_copy._state = memo[id(self._state)]
+            the_copy._name = self._name
+            the_copy._hash = self._hash
+            the_copy._mutable = self._mutable
+        return the_copy
+
+    def __reduce__(self):
+        return (set, (set(self),))
+
+
+_HASHED_TYPES = {_HashedDict, _HashedList, _HashedSet}
+
+for _name in ['pop', 'popitem', 'clear', 'update', '__ior__']:
+    setattr(_HashedDict, _name, _rehash_after(getattr(dict, _name)))
+for _name in ['extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__delitem__', '__iadd__', '__imul__']:
+    setattr(_HashedList, _name, _rehash_after(getattr(list, _name)))
+for _name in ['pop', 'clear', 'update', 'difference_update', 'intersection_update',
+              'symmetric_difference_update', '__ior__', '__iand__', '__isub__', '__ixor__']:
+    setattr(_HashedSet, _name, _rehash_after(getattr(set, _name)))
+
+
 def _name_for_copy(old_name,next_integer):
     """
     Create a name to use for a copy of an object.
@@ -209,7 +623,7 @@ def _print_object(object, heading=None):
         print(title)
         print(dashes)
         for (varname,val) in vars(object).items():
-            if varname != '__name__':
+            if varname not in _NOT_STATE_VARS:
                 print(f"  - {varname} = {val}")
         print('')
     else: 
@@ -263,6 +677,23 @@ class Domain():
         # list of all methods for multigoals
         self._multigoal_method_list = []
 
+        # names of tasks and unigoal state variables, and methods, whose
+        # refinements the planner commits to (see declare_committed_tasks)
+        self._committed_tasks = set()
+        self._committed_methods = set()
+
+        # dictionary that maps action names to their costs (see
+        # declare_action_cost); other actions cost 1
+        self._action_cost_dict = {}
+
+        # function that estimates the cost of accomplishing a todo list, for
+        # find_plan_best_first (see declare_heuristic), or None
+        self._heuristic = None
+
+        # dictionary that maps methods to the names of the state variables
+        # that they read (see declare_method_reads)
+        self._method_reads = {}
+
     def __str__(self):
         return f"<Domain {self.__name__}>"
         
@@ -315,6 +746,8 @@ def print_domain(domain=None):
     print_actions(domain)
     print_commands(domain)
     print_methods(domain)
+    if domain._heuristic:
+        print('-- Heuristic:', domain._heuristic.__name__)
 
 def print_actions(domain=None):
     """Print the names of all the actions"""
@@ -324,6 +757,10 @@ def print_actions(domain=None):
         print('-- Actions:', ', '.join(domain._action_dict))
     else:
         print('-- There are no actions --')
+    if domain._action_cost_dict:
+        print('-- Action costs:', ', '.join(    \
+                [f'{name} {getattr(cost, "__name__", cost)}'
+                 for (name, cost) in domain._action_cost_dict.items()]))
 
 def print_operators():
     if verbose > 0:
@@ -374,6 +811,21 @@ def _print_multigoal_methods(domain):
     else:
         print('-- There are no multigoal methods --')
     
+def _print_committed(domain):
+    """Print the names of the committed tasks, unigoals, and methods, if any"""
+    if domain._committed_tasks:
+        print('-- Committed tasks and unigoals:', ', '.join(    \
+                [str(name) for name in domain._committed_tasks]))
+    if domain._committed_methods:
+        print('-- Committed methods:', ', '.join(    \
+                [m.__name__ for m in domain._committed_methods]))
+
+def _print_method_reads(domain):
+    """Print the state variables that methods read, for those that declared them"""
+    if domain._method_reads:
+        print('-- Method read-sets:', ', '.join(    \
+                [f"{m.__name__} ({', '.join(names)})" for (m, names) in domain._method_reads.items()]))
+
 def print_methods(domain=None):
     """Print tables showing what all the methods are"""
     if domain == None:
@@ -381,6 +833,8 @@ def print_methods(domain=None):
     _print_task_methods(domain)
     _print_unigoal_methods(domain)
     _print_multigoal_methods(domain)
+    _print_committed(domain)
+    _print_method_reads(domain)
 
 
 ################################################################################
@@ -405,6 +859,24 @@ def declare_actions(*actions):
 
 
 
+def declare_action_cost(action_name, cost):
+    """
+    declare_action_cost says what an action costs, for use by
+    find_plan_anytime. 'cost' is either a number or a function that takes
+    the same arguments as the action and returns a number, which is the cost
+    of applying the action in that state. Costs shouldn't be negative. An
+    action whose cost isn't declared costs 1. For example,
+        declare_action_cost('putdown', 0)
+        declare_action_cost('fly', fly_cost)
+    where fly_cost(state, plane, from_airport, to_airport) might return the
+    distance between the airports.
+    """
+    if current_domain == None:
+        raise Exception(f"cannot declare action costs until a domain has been created.")
+    current_domain._action_cost_dict[action_name] = cost
+    return current_domain._action_cost_dict
+
+
 def declare_operators(*actions):
     if verbose > 0:
         print("""
@@ -451,6 +923,13 @@ def declare_task_methods(task_name, *methods):
 
     This is like Pyhop's declare_methods function, except that it can be
     called several times to declare more methods for the same task.
+
+    A method may also be a generator function that yields several
+    alternative refinements, best first. The planner tries the next one
+    only if it backtracks, e.g.
+        def travel_by_any_taxi(state, p, x, y):
+            for taxi in sorted(state.taxis, key=lambda t: state.dist[t][x]):
+                yield [('call_taxi', p, taxi, x), ('ride_taxi', p, taxi, y)]
     """
     if current_domain == None:
         raise Exception(f"cannot declare methods until a domain has been created.")
@@ -530,6 +1009,77 @@ def declare_multigoal_methods(*methods):
     current_domain._multigoal_method_list.extend(new_mg_methods)
     return current_domain._multigoal_method_list    
 
+
+def declare_committed_tasks(*names):
+    """
+    'names' should be task names and/or state-variable names. For each task
+    or unigoal that has one of these names, GTPyhop will commit to the first
+    applicable method: if the planner fails later on, it won't go back and
+    try the other methods, but will backtrack to the most recent task or
+    goal that still has alternatives. For example,
+        declare_committed_tasks('move', 'take', 'put')
+
+    Since the planner never backtracks to a committed task, it doesn't need
+    to keep the state in which the task was refined, which can reduce the
+    memory used for long plans considerably. A task or unigoal that has only
+    one relevant method is always treated this way, so it doesn't need to
+    be declared.
+    """
+    if current_domain == None:
+        raise Exception(f"cannot declare committed tasks until a domain has been created.")
+    current_domain._committed_tasks.update(names)
+    return current_domain._committed_tasks
+
+
+def declare_committed_methods(*methods):
+    """
+    declare_committed_methods says that once the planner has used one of
+    'methods' to refine a task, unigoal, or multigoal, it shouldn't try the
+    methods that come after it in the list of relevant methods. Like
+    declare_committed_tasks, this lets the planner discard the state in
+    which the method was used. For example,
+        declare_committed_methods(m_choose_last_chance)
+    """
+    if current_domain == None:
+        raise Exception(f"cannot declare committed methods until a domain has been created.")
+    current_domain._committed_methods.update(methods)
+    return current_domain._committed_methods
+
+
+def declare_heuristic(heuristic):
+    """
+    declare_heuristic gives find_plan_best_first a function that estimates
+    how much it will cost (see declare_action_cost) to accomplish a todo
+    list. heuristic(state, todo_list) should return a number that isn't
+    negative, and should ignore items it doesn't know about (e.g., the
+    '_verify_g' tasks that GTPyhop adds). For example,
+        declare_heuristic(h_packages_not_delivered)
+    where h_packages_not_delivered might return twice the number of goals
+    ('at', package, location) in todo_list that aren't achieved in state.
+    Without a heuristic, find_plan_best_first uses 0.
+    """
+    if current_domain == None:
+        raise Exception(f"cannot declare a heuristic until a domain has been created.")
+    current_domain._heuristic = heuristic
+    return heuristic
+
+
+def declare_method_reads(method, *state_var_names):
+    """
+    declare_method_reads says that 'method', a task or unigoal method in the
+    current domain, reads only the state variables named in state_var_names,
+    so that it returns the same thing whenever it's called with the same
+    arguments in states where those variables have the same values. For
+    example, this says that m_take reads only clear and pos:
+        declare_method_reads(m_take, 'clear', 'pos')
+    A planner that has a method cache (see method_cache) can then reuse what
+    the method returned, instead of calling it again.
+    """
+    if current_domain == None:
+        raise Exception(f"cannot declare read-sets until a domain has been created.")
+    current_domain._method_reads[method] = tuple(state_var_names)
+    return current_domain._method_reads
+
     
 ################################################################################
 # A built-in multigoal method and its helper function.
@@ -623,176 +1173,1273 @@ def _m_verify_g(state, method, state_var, arg, desired_val, depth):
     """
     _m_verify_g is a method that GTPyhop uses to check whether a
     unigoal method has achieved the goal for which it was used.
+    (A Planner does the check itself, with Planner._verify_g.)
     """
-    if vars(state)[state_var][arg] != desired_val:
-        raise Exception(f"depth {depth}: method {method} didn't achieve",
-                f"goal {state_var}[{arg}] = {desired_val}")
-    if verbose >= 3:
-        print(f"depth {depth}: method {method} achieved",
-                f"goal {state_var}[{arg}] = {desired_val}")
-    return []       # i.e., don't create any subtasks or subgoals
+    return Planner()._verify_g(state, method, state_var, arg, desired_val, depth)
 
 
 def _m_verify_mg(state, method, multigoal, depth):
     """
     _m_verify_g is a method that GTPyhop uses to check whether a multigoal
     method has achieved the multigoal for which it was used.
+    (A Planner does the check itself, with Planner._verify_mg.)
     """
-    goal_dict = _goals_not_achieved(state,multigoal)
-    if goal_dict:
-        raise Exception(f"depth {depth}: method {method} " + \
-                        f"didn't achieve {multigoal}]")
-    if verbose >= 3:
-        print(f"depth {depth}: method {method} achieved {multigoal}")
-    return []
+    return Planner()._verify_mg(state, method, multigoal, depth)
 
 
 ################################################################################
-# Applying actions, commands, and methods
+# Detecting refinements that go around in a cycle
+
+
+detect_cycles = False
+"""
+If detect_cycles is True, then the planner keeps track of the unigoals and
+multigoals whose refinements are in progress along the current path of the
+search, together with the state_key() of the state in which each of their
+refinements started. If the planner is about to refine a goal in a state, and
+the same goal's refinement is already in progress in a state with the same
+state_key(), then it backtracks instead, since the new refinement would just
+repeat the old one. Without this, goal methods that keep re-pursuing the same
+goal without changing the state make the planner loop forever.
+
+Each search node carries the path as a dict that maps each of those keys to
+the (goal, state) pairs whose refinements started in states with that key, so
+the check takes constant time apart from computing state_key(); a key that
+matches is confirmed by comparing the states. An ('_on_path', outer_path) item
+after each goal's subgoals in the todo list puts back the path that was there
+before the goal's refinement started. state_key() is cheapest if the initial
+state keeps a hash (see State.track_hash), e.g.,
+find_plan(state.copy().track_hash(), todo_list).
+"""
 
 
-def _apply_action_and_continue(state, task1, todo_list, plan, depth):
-    """
-    _apply_action_and_continue is called only when task1's name matches an
-    action name. It applies the action by retrieving the action's function
-    definition and calling it on the arguments, then calls seek_plan
-    recursively on todo_list.
-    """
-    if verbose >= 3:
-        print(f'depth {depth} action {task1}: ', end='')
-    action = current_domain._action_dict[task1[0]]
-    newstate = action(state.copy(),*task1[1:])
-    if newstate:
-        if verbose >= 3:
-            print('applied')
-            newstate.display()
-        return seek_plan(newstate, todo_list, plan+[task1], depth+1)
-    if verbose >= 3:
-        print('not applicable')
+def _is_on_path(goal, state, key, path):
+    """
+    Whether 'path' (see detect_cycles) says that the refinement of goal in a
+    state equal to 'state', whose state_key() is key, is in progress
+    """
+    for (other_goal, other_state) in path.get(key, ()):
+        if other_goal == goal and other_state == state:
+            return True
     return False
 
 
-def _refine_task_and_continue(state, task1, todo_list, plan, depth):
-    """
-    If task1 is in the task-method dictionary, then iterate through the list
-    of relevant methods to find one that's applicable, apply it to get
-    additional todo_list items, and call seek_plan recursively on
-            [the additional items] + todo_list.
-
-    If the call to seek_plan fails, go on to the next method in the list.
-    """
-    relevant = current_domain._task_method_dict[task1[0]]
-    if verbose >= 3:
-        print(f'depth {depth} task {task1} methods {[m.__name__ for m in relevant]}')
-    for method in relevant:
-        if verbose >= 3: 
-            print(f'depth {depth} trying {method.__name__}: ', end='')
-        subtasks = method(state, *task1[1:])
-        # Can't just say "if subtasks:", because that's wrong if subtasks == []
-        if subtasks != False and subtasks != None:
-            if verbose >= 3:
-                print('applicable')
-                print(f'depth {depth} subtasks: {subtasks}')
-            result = seek_plan(state, subtasks+todo_list, plan, depth+1)
-            if result != False and result != None:
-                return result
+def _extend_path(path, goal, state, key):
+    """Return a copy of path that also has goal's refinement in state (see detect_cycles)"""
+    new_path = dict(path)
+    new_path[key] = path.get(key, ()) + ((goal, state),)
+    return new_path
+
+
+################################################################################
+# Applying actions, commands, and methods
+#
+# seek_plan does a depth-first search, trying methods in the order they were
+# declared, but it keeps its own stack of choice points rather than calling
+# itself recursively. A node of the search is a tuple
+#     (state, todo, plan, depth, path)
+# where todo and plan are linked lists made of 2-tuples: todo is
+# (first_item, rest_of_todo) and plan is (last_action, rest_of_plan), with
+# None for an empty list. Adding items to the todo list or an action to the
+# plan is thus O(1), and the nodes share their common tails. path is the
+# goals whose refinements are in progress (see detect_cycles), or {} if the
+# planner doesn't keep track of them.
+#
+# A choice point is a tuple
+#     (kind, state, item, todo, plan, depth, path, methods, i, alternatives)
+# saying that methods[i:] haven't been tried yet for 'item' (a task, unigoal,
+# or multigoal, according to kind) in the node (state, (item,todo), plan,
+# depth, path). If methods[i-1] is a generator (see below), alternatives is the
+# generator it returned, which may have more refinements to offer; otherwise
+# alternatives is None. A choice point is kept only if there are untried
+# methods or alternatives and the method that was chosen isn't committed (see
+# declare_committed_tasks), so the planner doesn't keep states that it can
+# never backtrack to.
+#
+# A method can be a generator function that yields several refinements, in
+# the order in which the planner should try them. The planner takes the
+# first one, and asks the generator for the next one only if it backtracks
+# to this choice point, so the alternatives are never all computed at once.
+# A refinement that is False or None is skipped.
+
+# kinds of choice points
+_TASK = 'task'
+_UNIGOAL = 'unigoal'
+_MULTIGOAL = 'multigoal'
+
+
+def _push_all(items, rest):
+    """Return the linked list of the members of 'items', followed by 'rest'"""
+    for item in reversed(items):
+        rest = (item, rest)
+    return rest
+
+
+def _linked_to_list(linked):
+    """Return a Python list of the members of a linked list"""
+    result = []
+    while linked is not None:
+        result.append(linked[0])
+        linked = linked[1]
+    return result
+
+
+def _start_node(state, todo_list, plan, depth):
+    """The search node for seek_plan's arguments"""
+    return (state, _push_all(todo_list, None), _push_all(plan[::-1], None), depth, {})
+
+
+def _plan_of(node):
+    """Return node's plan, as a list of actions"""
+    return _linked_to_list(node[2])[::-1]
+
+
+def _actions_after(prefix, plan):
+    """
+    'prefix' and 'plan' are plans as they are in search nodes, and 'prefix'
+    is a prefix of 'plan'. Return the list of actions that 'plan' adds.
+    """
+    actions = []
+    while plan is not prefix:
+        actions.append(plan[0])
+        plan = plan[1]
+    return actions[::-1]
+
+
+# what _try_methods gets from a generator method that has nothing left to yield
+_NO_MORE = object()
+
+
+# the markers in the list of entries that _seek_decomposition returns
+_BEGIN = '_begin'
+_END = ('_end',)
+
+
+def _is_marker(entry):
+    """Whether an entry that _seek_decomposition returns is a marker, not an action"""
+    return entry == _END or entry[0] == _BEGIN
+
+
+def _mark_refinement(node, item1, todo):
+    """
+    'node' comes from refining item1 in a node whose todo list was
+    (item1, todo). Return the same node, but with (_BEGIN, item1) at the
+    end of its plan and _END after the refinement in its todo list.
+    """
+    (state, new_todo, plan, depth, path) = node
+    subitems = []
+    while new_todo is not todo:
+        subitems.append(new_todo[0])
+        new_todo = new_todo[1]
+    return (state, _push_all(subitems, (_END, todo)), ((_BEGIN, item1), plan), depth, path)
+
+
+def _item_to_string(item):
+    """Return a string representation of a task or goal."""
+    ttype = get_type(item)
+    if ttype == 'list':
+        return str([str(x) for x in item])
+    elif ttype == 'tuple':
+        return str(tuple([str(x) for x in item]))
+    else:       # a multigoal
+        return str(item)
+
+
+def _luby(i):
+    """The i'th member of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if i == (1 << k) - 1:
+        return 1 << (k-1)
+    # otherwise i is in a repetition of the sequence's first 2**(k-1) - 1 members
+    return _luby(i - (1 << (k-1)) + 1)
+
+
+def _shuffled_order(rng, shuffle_splits):
+    """
+    Return a function for _expand's 'order' argument that shuffles the
+    methods with 'rng', replacing m_split_multigoal by a version that
+    shuffles its unigoals if shuffle_splits is True.
+    """
+    def split_shuffled(state, multigoal):
+        subgoals = m_split_multigoal(state, multigoal)
+        if not subgoals:
+            return subgoals
+        # the last subgoal is the multigoal itself, to achieve what's left
+        unigoals = subgoals[:-1]
+        rng.shuffle(unigoals)
+        return unigoals + subgoals[-1:]
+    split_shuffled.__name__ = m_split_multigoal.__name__
+
+    def order(methods):
+        methods = rng.sample(methods, len(methods))
+        if shuffle_splits:
+            methods = [split_shuffled if m is m_split_multigoal else m for m in methods]
+        return methods
+    return order
+
+
+################################################################################
+# Adaptive method ordering
+
+method_stats = None
+"""
+If method_stats is a MethodStats object (see below), then planners that
+are created without a method_stats argument, including the ones that
+find_plan and the other module functions create, use it to decide the
+order in which to try methods. Its initial value is None, which means to
+try them in the order they were declared.
+"""
+
+
+class MethodStats():
+    """
+    stats = MethodStats(filename, frozen) holds statistics about how well
+    each method has worked for each task name (or for unigoals, state
+    variable name; for multigoals, None). If filename is given and the file
+    exists, the statistics are read from it, and stats.save() writes them
+    back. For each (name, method name) pair, stats.counts has a list
+        [tries, successes, steps]
+    where tries is how many times find_plan has called the method, successes
+    is how many of its refinements were in the plans that find_plan returned,
+    and steps is how many search steps the tries took. A planner that has stats tries the methods
+    for an item in increasing order of expected_cost, breaking ties by the
+    order in which they were declared.
+
+    If frozen is True, the statistics aren't updated, so the method order,
+    and hence the plans, are the same every time (e.g., for benchmarks).
+    """
+
+    def __init__(self, filename=None, frozen=False):
+        self.filename = filename
+        self.frozen = frozen
+        self.counts = {}
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+
+    def __str__(self):
+        return f"<MethodStats {len(self.counts)} methods{', frozen' if self.frozen else ''}>"
+
+    def load(self, filename):
+        """Read the statistics in 'filename', which save wrote"""
+        with open(filename) as f:
+            for (name, method_name, tries, successes, steps) in json.load(f):
+                self.counts[(name, method_name)] = [tries, successes, steps]
+
+    def save(self, filename=None):
+        """Write the statistics to 'filename', or by default, self.filename"""
+        filename = filename or self.filename
+        if filename is None:
+            raise Exception(f"cannot save method statistics: no filename was given, and the MethodStats has none.")
+        rows = [json.dumps([name, method_name] + counts)
+                for ((name, method_name), counts) in self.counts.items()]
+        with open(filename, 'w') as f:
+            f.write('[\n' + ',\n'.join(rows) + '\n]\n')
+
+    def expected_cost(self, name, method_name):
+        """
+        An estimate of the number of search steps it takes for the method to
+        succeed: (steps + tries + 1) / (successes + 1). A method that hasn't
+        been tried has an estimate of 1, so it will be tried early.
+        """
+        (tries, successes, steps) = self.counts.get((name, method_name), (0, 0, 0))
+        return (steps + tries + 1) / (successes + 1)
+
+    def order(self, name, methods):
+        """Return the methods for 'name' in the order to try them"""
+        return sorted(methods, key=lambda m: self.expected_cost(name, m.__name__))
+
+    def record(self, name, method_name, succeeded, steps):
+        """Record a try of the method that succeeded or not, and took 'steps' steps"""
+        if self.frozen:
+            return
+        counts = self.counts.setdefault((name, method_name), [0, 0, 0])
+        counts[0] += 1
+        counts[1] += 1 if succeeded else 0
+        counts[2] += steps
+
+
+################################################################################
+# Memoizing methods
+
+method_cache = None
+"""
+If method_cache is a MethodCache object (see below), then planners that
+are created without a method_cache argument, including the ones that
+find_plan and the other module functions create, use it to remember what
+methods with declared read-sets returned. Its initial value is None, which
+means to call methods every time.
+"""
+
+# what MethodCache.lookup returns if it doesn't have a result
+_NOT_CACHED = object()
+
+
+class MethodCache():
+    """
+    cache = MethodCache(size) remembers what task and unigoal methods whose
+    read-sets have been declared (see declare_method_reads) returned, for up
+    to 'size' of the most recently used keys
+        (method, arguments, hash of the state variables in its read-set)
+    A planner that has the cache looks up each call of such a method, and
+    calls the method only if the key isn't there. cache.hits and cache.misses
+    are the numbers of lookups that found a result and that didn't, and
+    cache.hit_rate() is the fraction that did.
+
+    The hashes are sums of the hashes that tracked states keep (see
+    State.track_hash), so the lookups take constant time if the initial state
+    keeps a hash, and time proportional to the read-set's size otherwise (the
+    planner warns about this the first time it happens). The planner uses a
+    cached list of subtasks or subgoals without copying it. A method that
+    returns a generator is called every time.
+
+    A cache can be shared by planners in several threads: lookup, store, and
+    clear hold a lock while they change it.
+    """
+
+    def __init__(self, size=100000):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        # key -> result, with the most recently used keys last
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"<MethodCache {len(self._results)} results, {self.hits} hits, {self.misses} misses>"
+
+    def hit_rate(self):
+        """The fraction of lookups that found a result (0 if there were none)"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def lookup(self, key):
+        """Return the result for key, or _NOT_CACHED if there isn't one"""
+        with self._lock:
+            result = self._results.pop(key, _NOT_CACHED)
+            if result is _NOT_CACHED:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._results[key] = result
+        return result
+
+    def store(self, key, result):
+        """Remember the result for key, forgetting the least recently used one if need be"""
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.size:
+                del self._results[next(iter(self._results))]
+
+    def clear(self):
+        """Forget all the results, and reset the counters"""
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _read_set_key(state, state_var_names):
+    """The hash of the values of the named state variables in state"""
+    key = 0
+    for name in state_var_names:
+        value = vars(state).get(name)
+        if _value_mutable(value):
+            # its kept hash may be out of date (see State.track_hash)
+            key += _contribution(name, value)
         else:
-            if verbose >= 3:
-                print(f'not applicable')
-    if verbose >= 3:
-        print(f'depth {depth} could not accomplish task {task1}')        
-    return False
+            key += _value_hash(name, value)
+    return key & _MASK64
+
+
+################################################################################
+# Planners
+
+
+class Planner():
+    """
+    p = Planner(domain, verbose, verify_goals, method_stats, detect_cycles,
+    method_cache) creates an object that plans in 'domain', using the given
+    values of verbose, verify_goals, method_stats, detect_cycles, and
+    method_cache (which are described above). Any argument that is None
+    defaults to the current value of current_domain or of the module variable
+    with the same name.
+
+    The functions find_plan, seek_plan, find_plan_best_first,
+    find_plan_stream, find_plan_async, find_plan_lds,
+    find_plan_restarts, find_plan_anytime, and run_lazy_lookahead are also
+    methods of Planner. A planner reads nothing but its own domain and
+    settings, and has its own counter for naming the states it creates, so
+    several planners can run at once, in different threads and with
+    different domains, without affecting each other. For example, the following planners can be used
+    in two threads at the same time:
+        blocks_planner = Planner(blocks_domain, verbose=0)
+        sat_planner = Planner(sat_domain, verbose=0)
+    The module functions with the same names are a shorthand for creating a
+    Planner with the default arguments and calling its method. Note that the
+    declare_ functions still modify current_domain, so create the domains
+    before starting the threads.
+    """
 
+    def __init__(self, domain=None, verbose=None, verify_goals=None, method_stats=None,
+                 detect_cycles=None, method_cache=None):
+        self.domain = current_domain if domain is None else domain
+        self.verbose = globals()['verbose'] if verbose is None else verbose
+        self.verify_goals = \
+            globals()['verify_goals'] if verify_goals is None else verify_goals
+        self.method_stats = \
+            globals()['method_stats'] if method_stats is None else method_stats
+        self.detect_cycles = \
+            globals()['detect_cycles'] if detect_cycles is None else detect_cycles
+        self.method_cache = \
+            globals()['method_cache'] if method_cache is None else method_cache
+        # sequence numbers to use when copying states
+        self._state_numbers = itertools.count()
+        # while _seek_plan_learning is running: the tries of methods that
+        # haven't been backtracked over (see _try_methods), and the number
+        # of search steps so far
+        self._tries = None
+        self._steps = 0
 
-def _refine_unigoal_and_continue(state, goal1, todo_list, plan, depth):
-    """
-    If goal1 is in the unigoal-method dictionary, then iterate through the
-    list of relevant methods to find one that's applicable, apply it to get
-    additional todo_list items, and call seek_plan recursively on
-          [the additional items] + [verify_g] + todo_list,
-
-    where [verify_g] verifies whether the method actually achieved goal1.
-    If the call to seek_plan fails, go on to the next method in the list.
-    """
-    if verbose >= 3:
-        print(f'depth {depth} goal {goal1}: ', end='')
-    (state_var_name, arg, val) = goal1
-    if vars(state).get(state_var_name).get(arg) == val:
-        if verbose >= 3:
-            print(f'already achieved')
-        return seek_plan(state, todo_list, plan, depth+1)
-    relevant = current_domain._unigoal_method_dict[state_var_name]
-    if verbose >= 3:
-        print(f'methods {[m.__name__ for m in relevant]}')
-    for method in relevant:
-        if verbose >= 3: 
-            print(f'depth {depth} trying method {method.__name__}: ', end='')
-        subgoals = method(state,arg,val)
-        # Can't just say "if subgoals:", because that's wrong if subgoals == []
-        if subgoals != False and subgoals != None:
-            if verbose >= 3:
-                print('applicable')
-                print(f'depth {depth} subgoals: {subgoals}')
-            if verify_goals:
-                verification = [('_verify_g', method.__name__, \
-                                 state_var_name, arg, val, depth)]
+    def __str__(self):
+        return f"<Planner for {self.domain}>"
+
+    def _copy_state(self, state):
+        """Copy 'state', naming the copy with this planner's counter"""
+        return state.copy(_name_for_copy(state.__name__, next(self._state_numbers)))
+
+    def find_plan(self, state, todo_list):
+        """Like the module function find_plan, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        result = self.seek_plan(state, todo_list, [], 0)
+        if self.verbose >= 1: print('FP> result =',result,'\n')
+        return result
+
+    def seek_plan(self, state, todo_list, plan, depth):
+        """Like the module function seek_plan, but using this planner's domain and settings"""
+        if self.method_stats is not None and not self.method_stats.frozen:
+            return self._seek_plan_learning(state, todo_list, plan, depth)
+        node = _start_node(state, todo_list, plan, depth)
+        choices = []
+        while True:
+            if node is None:
+                # backtrack to the most recent choice point that has a method left
+                if not choices:
+                    return False
+                (node, choice) = self._try_methods(choices.pop())
+            else:
+                if self._is_solution(node):
+                    return _plan_of(node)
+                (node, choice) = self._expand(node)
+            if choice:
+                choices.append(choice)
+
+    def find_plan_stream(self, state, todo_list):
+        """Like the module function find_plan_stream, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_stream, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        node = _start_node(state, todo_list, [], 0)
+        choices = []
+        # the part of the plan that has already been yielded
+        streamed = node[2]
+        while True:
+            if node is None:
+                if not choices:
+                    if self.verbose >= 1: print('FP> result =',False,'\n')
+                    yield False
+                    return
+                (node, choice) = self._try_methods(choices.pop())
+            else:
+                if self._is_solution(node):
+                    for action in _actions_after(streamed, node[2]):
+                        if self.verbose >= 2: print(f'FP> committed to {action}')
+                        yield action
+                    if self.verbose >= 1: print('FP> result =',_plan_of(node),'\n')
+                    return
+                (node, choice) = self._expand(node)
+            if choice:
+                choices.append(choice)
+            # Backtracking can't undo the plan that the oldest choice point
+            # has, or if there are no choice points, the current plan
+            if choices:
+                committed = choices[0][4]
+            elif node is not None:
+                committed = node[2]
+            else:
+                continue
+            if committed is not streamed:
+                for action in _actions_after(streamed, committed):
+                    if self.verbose >= 2: print(f'FP> committed to {action}')
+                    yield action
+                streamed = committed
+
+    def find_plan_best_first(self, state, todo_list, weight=1, max_expansions=None):
+        """Like the module function find_plan_best_first, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_best_first, verbose={self.verbose}, weight={weight}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        heuristic = self.domain._heuristic
+        order = itertools.count()
+        # entries are (cost + weight * estimate, -depth, -order, cost, node),
+        # so that ties go to the deepest node, and then to the newest one
+        node = _start_node(state, todo_list, [], 0)
+        estimate = heuristic(state, list(todo_list)) if heuristic else 0
+        open_list = [(weight * estimate, 0, -next(order), 0, node)]
+        expansions = 0
+        result = False
+        while open_list:
+            (f, _, _, cost, node) = heapq.heappop(open_list)
+            if self._is_solution(node):
+                result = _plan_of(node)
+                break
+            if expansions == max_expansions:
+                if self.verbose >= 1: print(f'FP> stopped after {expansions} expansions')
+                break
+            expansions += 1
+            (successors, action_cost) = self._successors(node)
+            for new_node in successors:
+                new_cost = cost + action_cost
+                estimate = heuristic(new_node[0], _linked_to_list(new_node[1])) if heuristic else 0
+                heapq.heappush(open_list, (new_cost + weight * estimate, -new_node[3],
+                                           -next(order), new_cost, new_node))
+        if self.verbose >= 1:
+            print(f'FP> {expansions} expansions, {len(open_list)} nodes still open')
+            print('FP> result =',result,'\n')
+        return result
+
+    async def find_plan_async(self, state, todo_list, expansions=100, quantum=None):
+        """Like the module function find_plan_async, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_async, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        node = _start_node(state, todo_list, [], 0)
+        choices = []
+        count = 0
+        if quantum is not None:
+            end_of_slice = time.perf_counter() + quantum
+        while True:
+            if node is None:
+                if not choices:
+                    result = False
+                    break
+                (node, choice) = self._try_methods(choices.pop())
+            else:
+                if self._is_solution(node):
+                    result = _plan_of(node)
+                    break
+                (node, choice) = self._expand(node)
+                count += 1
+            if choice:
+                choices.append(choice)
+            if count == expansions or \
+                    (quantum is not None and time.perf_counter() > end_of_slice):
+                # let the event loop run other tasks; if this task has been
+                # cancelled, asyncio.CancelledError is raised here
+                await asyncio.sleep(0)
+                count = 0
+                if quantum is not None:
+                    end_of_slice = time.perf_counter() + quantum
+        if self.verbose >= 1: print('FP> result =',result,'\n')
+        return result
+
+    def find_plan_lds(self, state, todo_list, max_discrepancies=None):
+        """Like the module function find_plan_lds, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_lds, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        limit = 0
+        while True:
+            if self.verbose >= 2:
+                print(f'FP> at most {limit} discrepancies')
+            (result, skipped) = self._seek_plan_lds(state, todo_list, limit)
+            if result != False or not skipped or limit == max_discrepancies:
+                break
+            limit += 1
+        if self.verbose >= 1: print('FP> result =',result,'\n')
+        return result
+
+    def find_plan_restarts(self, state, todo_list, seed=0, cutoff=100, max_restarts=None,
+                           shuffle_splits=False):
+        """Like the module function find_plan_restarts, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_restarts, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        rng = random.Random(seed)
+        order = None
+        restarts = 0
+        while True:
+            limit = cutoff * _luby(restarts + 1)
+            if self.verbose >= 2:
+                print(f'FP> search {restarts}, at most {limit} nodes')
+            (result, cut_off) = self._seek_plan_cutoff(state, todo_list, limit, order)
+            if result != False or not cut_off or restarts == max_restarts:
+                break
+            restarts += 1
+            order = _shuffled_order(rng, shuffle_splits)
+        if self.verbose >= 1: print('FP> result =',result,'\n')
+        return result
+
+    def find_plan_anytime(self, state, todo_list, time_limit=None):
+        """Like the module function find_plan_anytime, but using this planner's domain and settings"""
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan_anytime, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        node = _start_node(state, todo_list, [], 0)
+        cost = 0
+        best = float('inf')
+        # entries are (choice point, cost of the plan at the choice point)
+        choices = []
+        while True:
+            if time_limit is not None and time.perf_counter() > deadline:
+                if self.verbose >= 1: print('FP> time limit reached\n')
+                return
+            if node is None:
+                if not choices:
+                    if self.verbose >= 1: print('FP> no cheaper plan\n')
+                    return
+                (choice, cost) = choices.pop()
+                (node, choice) = self._try_methods(choice)
+                if choice:
+                    choices.append((choice, cost))
+                continue
+            if self._is_solution(node):
+                best = cost
+                plan = _plan_of(node)
+                if self.verbose >= 1: print(f'FP> result = {plan}, cost = {cost}')
+                yield (plan, cost)
+                node = None
+                continue
+            (state, (item1, todo), plan, depth, path) = node
+            action_cost = 0
+            if get_type(item1) in {'list','tuple'} and item1[0] in self.domain._action_dict:
+                action_cost = self._action_cost(state, item1)
+                if cost + action_cost >= best:
+                    if self.verbose >= 3:
+                        print(f'depth {depth} action {item1}: would cost at least {cost + action_cost}')
+                    node = None
+                    continue
+            (node, choice) = self._expand(node)
+            if choice:
+                choices.append((choice, cost))
+            cost += action_cost
+
+    def run_lazy_lookahead(self, state, todo_list, max_tries=10, repair=True):
+        """Like the module function run_lazy_lookahead, but using this planner's domain and settings"""
+        
+        if self.verbose >= 1: 
+            print(f"RLL> run_lazy_lookahead, verbose = {self.verbose}, max_tries = {max_tries}")
+            print(f"RLL> initial state: {state.__name__}")
+            print('RLL> To do:', todo_list)
+
+        # the rest of the current plan, with its decomposition if repair is
+        # True (see _seek_decomposition), or None if there isn't one
+        entries = None
+        # the tasks and goals whose refinements contain the next action
+        open_items = []
+        for tries in range(1,max_tries+1):
+            if entries is None:
+                if self.verbose >= 1: 
+                    ordinals = {1:'st',2:'nd',3:'rd'}
+                    if ordinals.get(tries):
+                        print(f"RLL> {tries}{ordinals.get(tries)} call to find_plan:\n")
+                    else:
+                        print(f"RLL> {tries}th call to find_plan:\n")
+                if repair:
+                    entries = self._find_decomposition(state, todo_list)
+                else:
+                    entries = self.find_plan(state, todo_list)
+                open_items = []
+                if entries == False or entries == None:
+                    if self.verbose >= 1:
+                        raise Exception(
+                                f"run_lazy_lookahead: find_plan has failed")
+                    return state
+                if not [entry for entry in entries if not _is_marker(entry)]:
+                    if self.verbose >= 1: 
+                        print(f'RLL> Empty plan => success',
+                              f'after {tries} calls to find_plan.')
+                    if self.verbose >= 2: state.display(heading='> final state')
+                    return state
+            (state, failed) = self._execute(state, entries, open_items)
+            if failed is None:
+                if self.verbose >= 1:
+                    print(f'RLL> Plan ended; will call find_plan again.')
+                entries = None
+            elif repair and open_items:
+                entries = self._repair(state, entries, failed, open_items)
             else:
-                verification = []
-            todo_list = subgoals + verification + todo_list
-            result = seek_plan(state, todo_list, plan, depth+1)
-            if result != False and result != None:
-                return result
+                entries = None
+            
+        if self.verbose >= 1: print('RLL> Too many tries, giving up.')
+        if self.verbose >= 2: state.display(heading='RLL> final state')
+        return state
+
+    def _execute(self, state, entries, open_items):
+        """
+        Execute the commands for the actions in 'entries', keeping track of
+        open_items as _repair needs it. Return (state, failed), where state
+        is the state that results and failed is the index in entries of the
+        action whose command failed, or None if none of them failed.
+        """
+        for (i, entry) in enumerate(entries):
+            if entry == _END:
+                open_items.pop()
+                continue
+            if entry[0] == _BEGIN:
+                open_items.append(entry[1])
+                continue
+            command_name = 'c_' + entry[0]
+            command_func = self.domain._command_dict.get(command_name)
+            if command_func == None:
+                if self.verbose >= 1: 
+                    print(f'RLL> {command_name} not defined, using {entry[0]} instead\n')
+                command_func = self.domain._action_dict.get(entry[0])
+                
+            if self.verbose >= 1:
+                print('RLL> Command:', [command_name] + list(entry[1:]))
+            new_state = self._apply_command_and_continue(state, command_func, entry[1:])
+            if new_state == False:
+                if self.verbose >= 1: 
+                    print(f'RLL> WARNING: command {command_name} failed.')
+                return (state, i)
+            if self.verbose >= 2: 
+                new_state.display()
+            state = new_state
+        return (state, None)
+
+    def _repair(self, state, entries, failed, open_items):
+        """
+        The command for the action entries[failed] has failed, and
+        open_items are the tasks and goals whose refinements contain the
+        action, outermost first. Find a new refinement for the innermost
+        one of them for which there is one in 'state', and return the new
+        entries: that refinement, followed by what came after the old one.
+        The items that are still open are left in open_items. If none of
+        them has a refinement, return None.
+        """
+        # ends[k] will be the index of the end marker for open_items[k]
+        ends = []
+        depth = 0
+        for j in range(failed+1, len(entries)):
+            if entries[j] == _END:
+                if depth == 0:
+                    ends.append(j)
+                else:
+                    depth -= 1
+            elif entries[j][0] == _BEGIN:
+                depth += 1
+        ends.reverse()
+        while open_items:
+            item = open_items.pop()
+            end = ends.pop()
+            if self.verbose >= 1:
+                print(f'RLL> will find a new refinement for {_item_to_string(item)}:\n')
+            new_entries = self._find_decomposition(state, [item])
+            if new_entries != False:
+                return new_entries + entries[end+1:]
+        if self.verbose >= 1:
+            print(f'RLL> no new refinement; will call find_plan.')
+        return None
+
+    def _find_decomposition(self, state, todo_list):
+        """
+        Like find_plan, but return the plan's entries as _seek_decomposition
+        does, or False if there's no plan.
+        """
+        if self.verbose >= 1: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
+            print(f'FP> find_plan, verbose={self.verbose}:')
+            print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
+        entries = self._seek_decomposition(state, todo_list)
+        if self.verbose >= 1:
+            if entries == False:
+                print('FP> result =',entries,'\n')
+            else:
+                print('FP> result =',[e for e in entries if not _is_marker(e)],'\n')
+        return entries
+
+    def _seek_decomposition(self, state, todo_list):
+        """
+        Do seek_plan's search, but return a list of 'entries' that records
+        the plan's decomposition: the plan's actions, with (_BEGIN, item)
+        before and _END after the actions that come from the refinement of
+        each task, unigoal, or multigoal 'item'. Return False if there's no
+        plan.
+        """
+        node = _start_node(state, todo_list, [], 0)
+        choices = []
+        while True:
+            if node is None:
+                if not choices:
+                    return False
+                choice = choices.pop()
+                (node, new_choice) = self._try_methods(choice)
+                if node is not None:
+                    node = _mark_refinement(node, choice[2], choice[3])
+                choice = new_choice
+            else:
+                if self._is_solution(node):
+                    return _plan_of(node)
+                (state, (item1, todo), plan, depth, path) = node
+                if item1 == _END:
+                    # the end of a refinement; record it in the plan
+                    (node, choice) = ((state, todo, (_END, plan), depth, path), None)
+                else:
+                    (node, choice) = self._expand(node)
+                    # a refinement (not an action, or a goal that was already
+                    # achieved) leaves the plan alone and changes the todo list
+                    if node is not None and node[2] is plan and node[1] is not todo:
+                        node = _mark_refinement(node, item1, todo)
+            if choice:
+                choices.append(choice)
+
+    def _apply_action_and_continue(self, state, task1, todo, plan, depth, path):
+        """
+        _apply_action_and_continue is called only when task1's name matches an
+        action name. It applies the action by retrieving the action's function
+        definition and calling it on the arguments. It returns (node, None),
+        where node is the search node that comes next, or None if the action
+        isn't applicable. (An action never creates a choice point.)
+        """
+        if self.verbose >= 3:
+            print(f'depth {depth} action {task1}: ', end='')
+        action = self.domain._action_dict[task1[0]]
+        newstate = action(self._copy_state(state),*task1[1:])
+        if newstate:
+            if self.verbose >= 3:
+                print('applied')
+                newstate.display()
+            return ((newstate, todo, (task1, plan), depth+1, path), None)
+        if self.verbose >= 3:
+            print('not applicable')
+        return (None, None)
+
+    def _refine_task_and_continue(self, state, task1, todo, plan, depth, path, order=None):
+        """
+        If task1 is in the task-method dictionary, then iterate through the list
+        of relevant methods to find one that's applicable, and return the node
+        whose todo list is [the method's subtasks] + todo, together with a choice
+        point for the other methods (as _try_methods does). If 'order' isn't
+        None, the methods are tried in the order given by order(relevant), and
+        otherwise, if self.method_stats isn't None, in the order it gives.
+        """
+        relevant = self.domain._task_method_dict[task1[0]]
+        if order:
+            relevant = order(relevant)
+        elif self.method_stats is not None:
+            relevant = self.method_stats.order(task1[0], relevant)
+        if self.verbose >= 3:
+            print(f'depth {depth} task {task1} methods {[m.__name__ for m in relevant]}')
+        return self._try_methods((_TASK, state, task1, todo, plan, depth, path, relevant, 0, None))
+
+    def _refine_unigoal_and_continue(self, state, goal1, todo, plan, depth, path, order=None):
+        """
+        If goal1 is in the unigoal-method dictionary, then iterate through the
+        list of relevant methods to find one that's applicable, and return the
+        node whose todo list is
+              [the method's subgoals] + [verify_g] + todo,
+        where [verify_g] verifies whether the method actually achieved goal1.
+        'order' is as in _refine_task_and_continue. If self.detect_cycles is
+        True and path says that goal1's refinement is already in progress in
+        an equal state, return (None, None).
+        """
+        if self.verbose >= 3:
+            print(f'depth {depth} goal {goal1}: ', end='')
+        (state_var_name, arg, val) = goal1
+        if vars(state).get(state_var_name).get(arg) == val:
+            if self.verbose >= 3:
+                print(f'already achieved')
+            return ((state, todo, plan, depth+1, path), None)
+        if self.detect_cycles and _is_on_path(goal1, state, state.state_key(), path):
+            if self.verbose >= 3:
+                print(f'already being achieved in the same state')
+            return (None, None)
+        relevant = self.domain._unigoal_method_dict[state_var_name]
+        if order:
+            relevant = order(relevant)
+        elif self.method_stats is not None:
+            relevant = self.method_stats.order(state_var_name, relevant)
+        if self.verbose >= 3:
+            print(f'methods {[m.__name__ for m in relevant]}')
+        return self._try_methods((_UNIGOAL, state, goal1, todo, plan, depth, path, relevant, 0, None))
+
+    def _refine_multigoal_and_continue(self, state, goal1, todo, plan, depth, path, order=None):
+        """
+        If goal1 is a multigoal, then iterate through the list of multigoal
+        methods to find one that's applicable, and return the node whose todo
+        list is
+              [the method's subgoals] + [verify_mg] + todo,
+        where [verify_mg] verifies whether the method actually achieved goal1.
+        'order' and self.detect_cycles are as in _refine_unigoal_and_continue.
+        """
+        if self.verbose >= 3:
+            print(f'depth {depth} multigoal {goal1}: ', end='')
+        if self.detect_cycles and _is_on_path(goal1, state, state.state_key(), path):
+            if self.verbose >= 3:
+                print(f'already being achieved in the same state')
+            return (None, None)
+        relevant = self.domain._multigoal_method_list
+        if order:
+            relevant = order(relevant)
+        elif self.method_stats is not None:
+            relevant = self.method_stats.order(None, relevant)
+        if self.verbose >= 3:
+            print(f'methods {[m.__name__ for m in relevant]}')
+        return self._try_methods((_MULTIGOAL, state, goal1, todo, plan, depth, path, relevant, 0, None))
+
+    def _try_methods(self, choice):
+        """
+        'choice' is a choice point (see above). Try its untried alternatives and
+        methods in order until one of them gives a refinement. Return (node,
+        new_choice), where node is the node that the refinement produces and
+        new_choice is a choice point for whatever remains untried (None if
+        nothing does, or if the method is committed). If nothing gives a
+        refinement, return (None, None).
+        """
+        (kind, state, item1, todo, plan, depth, path, methods, i, alternatives) = choice
+        while alternatives is not None or i < len(methods):
+            if alternatives is not None:
+                method = methods[i-1]
+                subitems = next(alternatives, _NO_MORE)
+                if subitems is _NO_MORE:
+                    if self.verbose >= 3:
+                        print(f'depth {depth} {method.__name__} has no more alternatives')
+                    alternatives = None
+                    continue
+                if self.verbose >= 3:
+                    print(f'depth {depth} next alternative from {method.__name__}: ', end='')
+            else:
+                method = methods[i]
+                i += 1
+                if self.verbose >= 3:
+                    if kind == _TASK:
+                        print(f'depth {depth} trying {method.__name__}: ', end='')
+                    else:
+                        print(f'depth {depth} trying method {method.__name__}: ', end='')
+                subitems = self._call_method(kind, method, state, item1)
+                if isinstance(subitems, types.GeneratorType):
+                    alternatives = subitems
+                    subitems = next(alternatives, None)
+            # Can't just say "if subitems:", because that's wrong if subitems == []
+            if subitems != False and subitems != None:
+                if self.verbose >= 3:
+                    print('applicable')
+                    print(f'depth {depth} {"subtasks" if kind == _TASK else "subgoals"}: {subitems}')
+                if kind == _TASK or not self.verify_goals:
+                    verification = []
+                elif kind == _UNIGOAL:
+                    verification = [('_verify_g', method.__name__, item1[0], item1[1], item1[2], depth)]
+                else:
+                    verification = [('_verify_mg', method.__name__, item1, depth)]
+                new_path = path
+                if kind != _TASK and self.detect_cycles:
+                    new_path = _extend_path(path, item1, state, state.state_key())
+                    verification.append(('_on_path', path))
+                if self._tries is not None:
+                    # '_method_done' tells _expand when the refinement has
+                    # been accomplished
+                    method_try = [None if kind == _MULTIGOAL else item1[0],
+                                  method.__name__, self._steps, None]
+                    self._tries.append(method_try)
+                    verification.append(('_method_done', method_try))
+                node = (state, _push_all(subitems, _push_all(verification, todo)), plan, depth+1, new_path)
+                if (alternatives is not None or i < len(methods)) and not self._is_committed(kind, item1, method):
+                    return (node, (kind, state, item1, todo, plan, depth, path, methods, i, alternatives))
+                return (node, None)
+            if self.verbose >= 3:
+                print(f'not applicable')
+            if self._tries is not None:
+                self.method_stats.record(None if kind == _MULTIGOAL else item1[0],
+                                         method.__name__, False, 0)
+        if self.verbose >= 3:
+            if kind == _TASK:
+                print(f'depth {depth} could not accomplish task {item1}')
+            elif kind == _UNIGOAL:
+                print(f'depth {depth} could not achieve goal {item1}')
+            else:
+                print(f'depth {depth} could not achieve multigoal {item1}')
+        return (None, None)
+
+    def _call_method(self, kind, method, state, item1):
+        """
+        Return what 'method' returns for item1 in state. If the planner has a
+        method cache and method's read-set was declared, look it up in the
+        cache first, and store it there if it wasn't there already.
+        """
+        if kind == _TASK:
+            args = item1[1:]
+        elif kind == _UNIGOAL:
+            args = (item1[1], item1[2])
         else:
-            if verbose >= 3:
-                print(f'not applicable')        
-    if verbose >= 3:
-        print(f'depth {depth} could not achieve goal {goal1}')        
-    return False
+            return method(state, item1)
+        reads = None if self.method_cache is None else self.domain._method_reads.get(method)
+        if reads is None:
+            return method(state, *args)
+        if '__zobrist__' not in vars(state):
+            warnings.warn("the method cache is being used with a state that doesn't keep a hash, "
+                          "so each lookup hashes whole state variables; "
+                          "call track_hash() on the initial state to avoid this", stacklevel=2)
+        key = (method, args, _read_set_key(state, reads))
+        try:
+            result = self.method_cache.lookup(key)
+        except TypeError:
+            # an argument that can't be hashed
+            return method(state, *args)
+        if result is _NOT_CACHED:
+            result = method(state, *args)
+            if not isinstance(result, types.GeneratorType):
+                self.method_cache.store(key, result)
+        return result
+
+    def _is_committed(self, kind, item1, method):
+        """Whether the planner should commit to 'method' once it has used it for item1"""
+        if method in self.domain._committed_methods:
+            return True
+        return kind != _MULTIGOAL and item1[0] in self.domain._committed_tasks
+
+    def _expand(self, node, order=None):
+        """
+        Apply or refine the first item in node's todo list. Return (next_node,
+        choice), where next_node is None if the item can't be applied or
+        refined, and choice is a choice point for the item's other refinements,
+        or None if there aren't any. 'order' is as in _refine_task_and_continue.
+        """
+        (state, (item1, todo), plan, depth, path) = node
+        ttype = get_type(item1)
+        if ttype in {'Multigoal'}:
+            return self._refine_multigoal_and_continue(state, item1, todo, plan, depth, path, order)
+        elif ttype in {'list','tuple'}:
+            if item1[0] in {'_verify_g', '_verify_mg'}:
+                # do the check here, rather than with _m_verify_g or
+                # _m_verify_mg, so that it uses this planner's settings
+                getattr(self, item1[0])(state, *item1[1:])
+                return ((state, todo, plan, depth+1, path), None)
+            if item1[0] == '_method_done':
+                # the step at which the method's refinement was accomplished
+                item1[1][3] = self._steps
+                return ((state, todo, plan, depth, path), None)
+            if item1[0] == '_on_path':
+                # the end of a goal's refinement; take it off the path (see
+                # detect_cycles)
+                return ((state, todo, plan, depth, item1[1]), None)
+            if item1[0] in self.domain._action_dict:
+                return self._apply_action_and_continue(state, item1, todo, plan, depth, path)
+            elif item1[0] in self.domain._task_method_dict:
+                return self._refine_task_and_continue(state, item1, todo, plan, depth, path, order)
+            elif item1[0] in self.domain._unigoal_method_dict:
+                return self._refine_unigoal_and_continue(state, item1, todo, plan, depth, path, order)
+        raise Exception(    \
+            f"depth {depth}: {item1} isn't an action, task, unigoal, or multigoal\n")
 
+    def _successors(self, node):
+        """
+        Return (successors, action_cost), where successors is a list of the
+        nodes that all the ways of applying or refining the first item in
+        node's todo list produce (one if it's an action), and action_cost is
+        the action's cost, or 0 if it isn't an action.
+        """
+        (state, (item1, todo), plan, depth, path) = node
+        action_cost = 0
+        if get_type(item1) in {'list','tuple'} and item1[0] in self.domain._action_dict:
+            action_cost = self._action_cost(state, item1)
+        successors = []
+        (new_node, choice) = self._expand(node)
+        while new_node is not None:
+            successors.append(new_node)
+            if not choice:
+                break
+            (new_node, choice) = self._try_methods(choice)
+        return (successors, action_cost)
+
+    def _is_solution(self, node):
+        """
+        Print node's todo list if self.verbose >= 2, and return True if the list is
+        empty, i.e., node's plan is a solution.
+        """
+        (state, todo, plan, depth, path) = node
+        if self.verbose >= 2: 
+            todo_string = '[' + ', '.join([_item_to_string(x) for x in _linked_to_list(todo)]) + ']'
+            print(f'depth {depth} todo_list ' + todo_string)
+        if todo is None:
+            if self.verbose >= 3:
+                print(f'depth {depth} no more tasks or goals, return plan')
+            return True
+        return False
+
+    def _seek_plan_learning(self, state, todo_list, plan, depth):
+        """
+        Do seek_plan's search, and record in self.method_stats how each
+        method that it calls does. A try of a method succeeds if its
+        refinement is in the plan, and took the steps from the method call
+        to the '_method_done' item after its refinement. It fails if the
+        method isn't applicable, or if the search backtracks over it.
+        """
+        node = _start_node(state, todo_list, plan, depth)
+        # entries are (choice point, len(self._tries) before its method was tried)
+        choices = []
+        self._tries = []
+        self._steps = 0
+        try:
+            while True:
+                if node is None:
+                    if not choices:
+                        return False
+                    (choice, tries) = choices.pop()
+                    self._backtrack(tries)
+                    (node, choice) = self._try_methods(choice)
+                else:
+                    if self._is_solution(node):
+                        for (name, method_name, start, end) in self._tries:
+                            self.method_stats.record(name, method_name, True, end - start)
+                        self._tries = []
+                        return _plan_of(node)
+                    tries = len(self._tries)
+                    (node, choice) = self._expand(node)
+                self._steps += 1
+                if choice:
+                    choices.append((choice, tries))
+        finally:
+            self._backtrack(0)
+            self._tries = None
+
+    def _backtrack(self, tries):
+        """
+        The search has backtracked over all but the first 'tries' entries in
+        self._tries, so record the rest of them as failures.
+        """
+        for (name, method_name, start, end) in self._tries[tries:]:
+            self.method_stats.record(name, method_name, False, self._steps - start)
+        del self._tries[tries:]
+
+    def _seek_plan_lds(self, state, todo_list, limit):
+        """
+        Do seek_plan's depth-first search, but skip every refinement that would
+        make the plan have more than 'limit' discrepancies. Return (plan,
+        skipped), where plan is the plan or False, and skipped tells whether any
+        refinements were skipped.
+        """
+        node = _start_node(state, todo_list, [], 0)
+        discrepancies = 0
+        # entries are (choice point, discrepancies before it, refinements used from it)
+        choices = []
+        skipped = False
+        while True:
+            if node is None:
+                if not choices:
+                    return (False, skipped)
+                (choice, before, used) = choices.pop()
+                if before + used > limit:
+                    # so would all of the choice point's later refinements
+                    skipped = True
+                    continue
+                (node, choice) = self._try_methods(choice)
+                discrepancies = before + used
+                if choice:
+                    choices.append((choice, before, used + 1))
+            else:
+                if self._is_solution(node):
+                    return (_plan_of(node), skipped)
+                (node, choice) = self._expand(node)
+                if choice:
+                    choices.append((choice, discrepancies, 1))
 
-def _refine_multigoal_and_continue(state, goal1, todo_list, plan, depth):
-    """
-    If goal1 is a multigoal, then iterate through the list of multigoal
-    methods to find one that's applicable, apply it to get additional
-    todo_list items, and call seek_plan recursively on
-          [the additional items] + [verify_mg] + todo_list,
-
-    where [verify_mg] verifies whether the method actually achieved goal1.
-    If the call to seek_plan fails, go on to the next method in the list.
-    """
-    if verbose >= 3:
-        print(f'depth {depth} multigoal {goal1}: ', end='')
-    relevant = current_domain._multigoal_method_list
-    if verbose >= 3:
-        print(f'methods {[m.__name__ for m in relevant]}')
-    for method in relevant:
-        if verbose >= 3: 
-            print(f'depth {depth} trying method {method.__name__}: ', end='')
-        subgoals = method(state,goal1)
-        # Can't just say "if subgoals:", because that's wrong if subgoals == []
-        if subgoals != False and subgoals != None:
-            if verbose >= 3:
-                print('applicable')
-                print(f'depth {depth} subgoals: {subgoals}')
-            if verify_goals:
-                verification = [('_verify_mg', method.__name__, goal1, depth)]
+    def _seek_plan_cutoff(self, state, todo_list, limit, order):
+        """
+        Do seek_plan's depth-first search, with _expand's 'order' argument, but
+        stop after expanding 'limit' nodes. Return (plan, cut_off), where plan
+        is the plan or False, and cut_off tells whether the search was stopped.
+        """
+        node = _start_node(state, todo_list, [], 0)
+        choices = []
+        nodes = 0
+        while True:
+            if node is None:
+                if not choices:
+                    return (False, False)
+                (node, choice) = self._try_methods(choices.pop())
             else:
-                verification = []
-            todo_list = subgoals + verification + todo_list
-            result = seek_plan(state, todo_list, plan, depth+1)
-            if result != False and result != None:
-                return result
+                if self._is_solution(node):
+                    return (_plan_of(node), False)
+                if nodes == limit:
+                    if self.verbose >= 2:
+                        print(f'FP> stopped after {nodes} nodes')
+                    return (False, True)
+                nodes += 1
+                (node, choice) = self._expand(node, order)
+            if choice:
+                choices.append(choice)
+
+    def _action_cost(self, state, action):
+        """The cost of applying 'action' in 'state'"""
+        cost = self.domain._action_cost_dict.get(action[0], 1)
+        if callable(cost):
+            return cost(state, *action[1:])
+        return cost
+
+    def _apply_command_and_continue(self, state, command, args):
+        """
+        _apply_command_and_continue applies 'command' by retrieving its
+        function definition and calling it on the arguments.
+        """
+        if self.verbose >= 3:
+            print(f"_apply_command_and_continue {command.__name__}, args = {args}")
+        next_state = command(self._copy_state(state),*args)
+        if next_state:
+            if self.verbose >= 3:
+                print('applied')
+                next_state.display()
+            return next_state
         else:
-            if verbose >= 3:
-                print(f'not applicable')
-    if verbose >= 3:
-        print(f'depth {depth} could not achieve multigoal {goal1}')        
-    return False
+            if self.verbose >= 3:
+                print('not applicable')
+            return False
+
+    def _verify_g(self, state, method, state_var, arg, desired_val, depth):
+        """
+        Check whether a unigoal method has achieved the goal for which it
+        was used (see _m_verify_g).
+        """
+        if vars(state)[state_var][arg] != desired_val:
+            raise Exception(f"depth {depth}: method {method} didn't achieve",
+                    f"goal {state_var}[{arg}] = {desired_val}")
+        if self.verbose >= 3:
+            print(f"depth {depth}: method {method} achieved",
+                    f"goal {state_var}[{arg}] = {desired_val}")
+        return []       # i.e., don't create any subtasks or subgoals
+
+    def _verify_mg(self, state, method, multigoal, depth):
+        """
+        Check whether a multigoal method has achieved the multigoal for
+        which it was used (see _m_verify_mg).
+        """
+        goal_dict = _goals_not_achieved(state,multigoal)
+        if goal_dict:
+            raise Exception(f"depth {depth}: method {method} " + \
+                            f"didn't achieve {multigoal}]")
+        if self.verbose >= 3:
+            print(f"depth {depth}: method {method} achieved {multigoal}")
+        return []
 
 
 ############################################################
 # The planning algorithm
 
+# The module functions use a new Planner for current_domain, verbose, and
+# verify_goals each time they are called.
+
 
 def find_plan(state, todo_list):
     """
@@ -802,14 +2449,10 @@ def find_plan(state, todo_list):
     returns False. Arguments:
      - 'state' is a state;
      - 'todo_list' is a list of goals, tasks, and actions.
+    It uses current_domain, verbose, and verify_goals; to plan with other
+    settings, or in several threads at once, use a Planner (see below).
     """
-    if verbose >= 1: 
-        todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
-        print(f'FP> find_plan, verbose={verbose}:')
-        print(f'    state = {state.__name__}\n    todo_list = {todo_string}')
-    result = seek_plan(state, todo_list, [], 0)
-    if verbose >= 1: print('FP> result =',result,'\n')
-    return result
+    return Planner().find_plan(state, todo_list)
 
 
 def pyhop(state, todo_list):
@@ -826,47 +2469,145 @@ def seek_plan(state, todo_list, plan, depth):
      - state is the current state
      - todo_list is the current list of goals, tasks, and actions
      - plan is the current partial plan
-     - depth is the recursion depth, for use in debugging
-    """
-    if verbose >= 2: 
-        todo_string = '[' + ', '.join([_item_to_string(x) for x in todo_list]) + ']'
-        print(f'depth {depth} todo_list ' + todo_string)
-    if todo_list == []:
-        if verbose >= 3:
-            print(f'depth {depth} no more tasks or goals, return plan')
-        return plan
-    item1 = todo_list[0]
-    ttype = get_type(item1)
-    if ttype in {'Multigoal'}:
-        return _refine_multigoal_and_continue(state, item1, todo_list[1:], plan, depth)
-    elif ttype in {'list','tuple'}:
-        if item1[0] in current_domain._action_dict:
-            return _apply_action_and_continue(state, item1, todo_list[1:], plan, depth)
-        elif item1[0] in current_domain._task_method_dict:
-            return _refine_task_and_continue(state, item1, todo_list[1:], plan, depth)
-        elif item1[0] in current_domain._unigoal_method_dict:
-            return _refine_unigoal_and_continue(state, item1, todo_list[1:], plan, depth)
-    raise Exception(    \
-        f"depth {depth}: {item1} isn't an action, task, unigoal, or multigoal\n")
-    return False
+     - depth is the search depth, for use in debugging
+    It returns the plan (a list of actions), or False if there isn't one.
+    """
+    return Planner().seek_plan(state, todo_list, plan, depth)
 
 
-def _item_to_string(item):
-    """Return a string representation of a task or goal."""
-    ttype = get_type(item)
-    if ttype == 'list':
-        return str([str(x) for x in item])
-    elif ttype == 'tuple':
-        return str(tuple([str(x) for x in item]))
-    else:       # a multigoal
-        return str(item)
+async def find_plan_async(state, todo_list, expansions=100, quantum=None):
+    """
+    find_plan_async is a coroutine that does the same search as find_plan,
+    and returns the same plan, but it lets the asyncio event loop run other
+    tasks every 'expansions' node expansions, and also (if quantum isn't
+    None) whenever it has run for 'quantum' seconds since it last did so.
+    Thus several planning requests can run in one event loop, e.g.,
+        plans = await asyncio.gather(find_plan_async(s1, todo1),
+                                     find_plan_async(s2, todo2))
+    and the search stops if the task that runs it is cancelled. Arguments:
+     - 'state' is a state;
+     - 'todo_list' is a list of goals, tasks, and actions;
+     - 'expansions' is the number of expansions between pauses;
+     - 'quantum' is the longest time, in seconds, between pauses.
+    """
+    return await Planner().find_plan_async(state, todo_list, expansions, quantum)
+
+
+def find_plan_stream(state, todo_list):
+    """
+    A generator that does find_plan's search, but yields the plan's actions
+    one at a time, as soon as no backtracking could undo them: i.e., once
+    every choice point that comes before them in the search has run out of
+    methods (or was for a committed task or method; see
+    declare_committed_tasks). The parts of the plan that come from
+    deterministic refinements are yielded while the search continues, so an
+    actor can start executing commands before the whole plan is known, e.g.
+        for action in find_plan_stream(state, todo_list):
+            if action == False: ...    // there's no plan
+            else: execute a command for the action
+    When the search is done, all the plan's actions have been yielded. If
+    there isn't a plan, the last thing yielded is False, and any actions
+    yielded before it can't be extended to a plan.
+    """
+    return Planner().find_plan_stream(state, todo_list)
+
+
+def find_plan_best_first(state, todo_list, weight=1, max_expansions=None):
+    """
+    Like find_plan, but do a best-first search instead of a depth-first one.
+    The search keeps a priority queue of the nodes it hasn't expanded, i.e.,
+    partial decompositions, each with a state, the rest of its todo list, and
+    its plan so far, and expands the node with the smallest value of
+        cost + weight * estimate
+    where cost is the cost of its plan (see declare_action_cost) and estimate
+    is what the domain's heuristic (see declare_heuristic) says about its
+    state and todo list. Expanding a node means applying the first item in
+    its todo list, if it's an action, or else refining it with every
+    applicable method (or every alternative a generator method yields).
+    With weight=1 and a heuristic that never overestimates, the plan is a
+    cheapest one among the plans the methods can produce; bigger weights
+    usually find a plan sooner. Ties go to the deepest node, so with no
+    heuristic and no action costs the search acts much like find_plan's.
+    Nodes share their states, todo lists, and plans with the nodes they
+    came from, so a node takes a constant amount of memory unless its
+    action made a new state.
+      - max_expansions, if it isn't None, is a limit on how many nodes to
+        expand before giving up and returning False.
+    """
+    return Planner().find_plan_best_first(state, todo_list, weight, max_expansions)
+
+
+def find_plan_lds(state, todo_list, max_discrepancies=None):
+    """
+    find_plan_lds is like find_plan, but it does a limited discrepancy
+    search, using the order of the relevant methods (and of the refinements
+    that a generator method yields) as its heuristic. A discrepancy is
+    a choice of a refinement other than the first applicable one; using the
+    k'th applicable refinement for a task or goal counts as k-1
+    discrepancies. find_plan_lds looks for a plan that has no discrepancies,
+    then for one with at most 1, then at most 2, and so on. It stops when it
+    finds a plan, when a search didn't skip anything (so there is no plan),
+    or after the search with at most max_discrepancies discrepancies.
+    Arguments:
+     - 'state' is a state;
+     - 'todo_list' is a list of goals, tasks, and actions;
+     - 'max_discrepancies' is the largest limit to try (None for no limit).
+    """
+    return Planner().find_plan_lds(state, todo_list, max_discrepancies)
+
+
+def find_plan_restarts(state, todo_list, seed=0, cutoff=100, max_restarts=None,
+                       shuffle_splits=False):
+    """
+    find_plan_restarts is like find_plan, but it does a series of
+    depth-first searches, each of which gives up after expanding a certain
+    number of nodes. The first search tries the methods in the order they
+    were declared; each later one shuffles the relevant methods each time it
+    refines a task or goal, using a random number generator seeded with
+    'seed', so the same seed always gives the same plan. The node limits are
+    cutoff * 1, 1, 2, 1, 1, 2, 4, 1, ... (the Luby sequence). A search that
+    ends without reaching its limit has searched everything, so if it didn't
+    find a plan, find_plan_restarts returns False. Arguments:
+     - 'state' is a state;
+     - 'todo_list' is a list of goals, tasks, and actions;
+     - 'seed' is the seed for the random number generator;
+     - 'cutoff' is the unit for the node limits;
+     - 'max_restarts' is how many times to restart (None for no limit)
+       before giving up and returning False;
+     - if 'shuffle_splits' is True, then the later searches also shuffle the
+       unigoals into which m_split_multigoal splits a multigoal.
+    """
+    return Planner().find_plan_restarts(state, todo_list, seed, cutoff, max_restarts,
+                                         shuffle_splits)
+
+
+def find_plan_anytime(state, todo_list, time_limit=None):
+    """
+    find_plan_anytime is a generator that keeps searching for cheaper plans
+    after it finds the first one. Each time it finds a plan that costs less
+    than the ones it found before, it yields (plan, cost), where cost is the
+    sum of the plan's action costs (see declare_action_cost). It does the
+    same depth-first search as find_plan, except that it backtracks from
+    every node whose partial plan costs at least as much as the best plan so
+    far (branch and bound). It stops when there is nothing left to search,
+    in which case the last plan it yielded is the cheapest one that the
+    methods can produce, or after 'time_limit' seconds, if time_limit isn't
+    None. For example,
+        for (plan, cost) in find_plan_anytime(state, todo_list, 10):
+            best_plan = plan
+    Arguments:
+     - 'state' is a state;
+     - 'todo_list' is a list of goals, tasks, and actions;
+     - 'time_limit' is the number of seconds to search (None for no limit).
+    """
+    return Planner().find_plan_anytime(state, todo_list, time_limit)
 
 
 ################################################################################
 # An actor
 
 
-def run_lazy_lookahead(state, todo_list, max_tries=10):
+def run_lazy_lookahead(state, todo_list, max_tries=10, repair=True):
     """
     An adaptation of the run_lazy_lookahead algorithm from Ghallab et al.
     (2016), Automated Planning and Acting. It works roughly like this:
@@ -875,85 +2616,23 @@ def run_lazy_lookahead(state, todo_list, max_tries=10):
             if plan = [] then return state    // the new current state 
             for each action in plan:
                 try to execute the corresponding command
-                if the command fails, continue the outer loop
+                if the command fails, repair the plan or continue the outer loop
     Arguments: 
       - 'state' is a state;
       - 'todo_list' is a list of tasks, goals, and multigoals;
-      - max_tries is a bound on how many times to execute the outer loop.
+      - max_tries is a bound on how many times to call find_plan or to
+        repair a plan;
+      - if repair is True, the plan keeps track of which task, goal, or
+        multigoal each action came from. When a command fails, only the
+        smallest of the tasks and goals that contain it, and for which there
+        is a new refinement in the current state, gets refined again; the
+        rest of the plan is kept. If repair is False, or there is no such
+        task or goal, it calls find_plan on todo_list again.
       
     Note: whenever run_lazy_lookahead encounters an action for which there is
     no corresponding command definition, it uses the action definition instead.
     """
-    
-    if verbose >= 1: 
-        print(f"RLL> run_lazy_lookahead, verbose = {verbose}, max_tries = {max_tries}")
-        print(f"RLL> initial state: {state.__name__}")
-        print('RLL> To do:', todo_list)
-
-    for tries in range(1,max_tries+1):
-        if verbose >= 1: 
-            ordinals = {1:'st',2:'nd',3:'rd'}
-            if ordinals.get(tries):
-                print(f"RLL> {tries}{ordinals.get(tries)} call to find_plan:\n")
-            else:
-                print(f"RLL> {tries}th call to find_plan:\n")
-        plan = find_plan(state, todo_list)
-        if plan == False or plan == None:
-            if verbose >= 1:
-                raise Exception(
-                        f"run_lazy_lookahead: find_plan has failed")
-            return state
-        if plan == []:
-            if verbose >= 1: 
-                print(f'RLL> Empty plan => success',
-                      f'after {tries} calls to find_plan.')
-            if verbose >= 2: state.display(heading='> final state')
-            return state
-        for action in plan:
-            command_name = 'c_' + action[0]
-            command_func = current_domain._command_dict.get(command_name)
-            if command_func == None:
-                if verbose >= 1: 
-                    print(f'RLL> {command_name} not defined, using {action[0]} instead\n')
-                command_func = current_domain._action_dict.get(action[0])
-                
-            if verbose >= 1:
-                print('RLL> Command:', [command_name] + list(action[1:]))
-            new_state = _apply_command_and_continue(state, command_func, action[1:])
-            if new_state == False:
-                if verbose >= 1: 
-                    print(f'RLL> WARNING: command {command_name} failed; will call find_plan.')
-                    break
-            else:
-                if verbose >= 2: 
-                    new_state.display()
-                state = new_state
-        # if state != False then we're here because the plan ended
-        if verbose >= 1 and state:
-            print(f'RLL> Plan ended; will call find_plan again.')
-        
-    if verbose >= 1: print('RLL> Too many tries, giving up.')
-    if verbose >= 2: state.display(heading='RLL> final state')
-    return state
-
-
-def _apply_command_and_continue(state, command, args):
-    """
-    _apply_command_and_continue applies 'command' by retrieving its
-    function definition and calling it on the arguments.
-    """
-    if verbose >= 3:
-        print(f"_apply_command_and_continue {command.__name__}, args = {args}")
-    next_state = command(state.copy(),*args)
-    if next_state:
-        if verbose >= 3:
-            print('applied')
-            next_state.display()
-        return next_state
-    else:
-        if verbose >= 3:
-            print('not applicable')
-        return False
+    return Planner().run_lazy_lookahead(state, todo_list, max_tries, repair)
 
 
 ###############################################################################
@@ -0,0 +1,423 @@
+"""
+Microbenchmarks for the GTPyhop engine itself, independent of any example
+domain. They measure:
+  - State.copy for states of several sizes
+  - seek_plan's cost per node, on a chain of actions
+  - the overhead of calling a task method
+  - _goals_not_achieved on large multigoals
+  - the declare_* functions
+  - the time to import gtpyhop (in a fresh Python process)
+
+Results are kept in a JSON file, keyed by git commit, so that two commits can
+be compared. Everything runs offline. Usage:
+    python microbenchmarks.py run                 # run and store under HEAD
+    python microbenchmarks.py compare OLD NEW     # flag regressions of NEW vs OLD
+    python microbenchmarks.py list                # commits that have results
+
+It can also sweep one parameter of the synthetic domains in
+Examples/synthetic_htn.py, printing planning time and peak memory for each
+value, e.g.
+    python microbenchmarks.py sweep depth 2 4 6 8 --branching 3 --failure_prob 0.5
+
+and time blocks_goal_splitting on random problems of increasing size, with
+m_make_clear using the 'above' state variable and with the earlier version
+that searched state.pos for the block above, e.g.
+    python microbenchmarks.py blocks 50 100 200 500
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Examples'))
+with contextlib.redirect_stdout(io.StringIO()):
+    import gtpyhop
+    import synthetic_htn
+    import blocks_goal_splitting
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'microbenchmark_results.json')
+
+
+################################################################################
+# The benchmarks. Each one returns a function to time, and the number of
+# operations that one call of that function performs.
+
+
+def _make_state(size):
+    """A blocks-world-like state with 'size' blocks"""
+    state = gtpyhop.State('bench')
+    state.pos = {b: (b + 1 if b + 1 < size else 'table') for b in range(size)}
+    state.clear = {b: (b == 0) for b in range(size)}
+    state.holding = {'hand': False}
+    return state
+
+
+def bench_state_copy(size):
+    state = _make_state(size)
+    return (lambda: state.copy()), 1
+
+
+def noop(state, *args):
+    return state
+
+
+def _m_chain(state, n):
+    if n == 0:
+        return []
+    return [('noop', n), ('chain', n - 1)]
+
+
+def _m_empty(state, *args):
+    return []
+
+
+def _bench_domain():
+    """Create (and make current) a domain for the seek_plan and method benchmarks"""
+    domain = gtpyhop.Domain('microbenchmarks')
+    gtpyhop.declare_actions(noop)
+    gtpyhop.declare_task_methods('chain', _m_chain)
+    gtpyhop.declare_task_methods('empty', _m_empty)
+    return domain
+
+
+def bench_seek_plan_per_node(length):
+    """find_plan on a chain of 'length' tasks, each refined into an action and the rest of the chain"""
+    domain = _bench_domain()
+    state = _make_state(10)
+    def run():
+        gtpyhop.current_domain = domain
+        gtpyhop.find_plan(state, [('chain', length)])
+    # each link of the chain is one task node and one action node
+    return run, 2 * length
+
+
+def bench_method_call(count):
+    """find_plan on 'count' tasks whose method returns [] immediately"""
+    domain = _bench_domain()
+    state = _make_state(10)
+    todo_list = [('empty',)] * count
+    def run():
+        gtpyhop.current_domain = domain
+        gtpyhop.find_plan(state, todo_list)
+    return run, count
+
+
+def bench_goals_not_achieved(size):
+    """_goals_not_achieved on a multigoal of 'size' unigoals, half of them unachieved"""
+    state = _make_state(size)
+    goal = gtpyhop.Multigoal('bench_goal')
+    goal.pos = {b: (state.pos[b] if b % 2 else 'table') for b in range(size)}
+    return (lambda: gtpyhop._goals_not_achieved(state, goal)), 1
+
+
+def bench_declare(count):
+    """
+    Declare 'count' actions, task methods and unigoal methods in a new domain,
+    which is then taken out of gtpyhop._domains so that the runs don't pile up there
+    """
+    functions = []
+    for i in range(count):
+        def f(state, *args):
+            return []
+        f.__name__ = f'f{i}'
+        functions.append(f)
+    def run():
+        domain = gtpyhop.Domain('declare_bench')
+        gtpyhop.declare_actions(*functions)
+        for i, f in enumerate(functions):
+            gtpyhop.declare_task_methods(f'task{i}', f)
+            gtpyhop.declare_unigoal_methods(f'var{i}', f)
+        gtpyhop._domains.remove(domain)
+    return run, 3 * count
+
+
+def bench_import():
+    """Import gtpyhop in a new Python process, minus the cost of starting the process"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    def run():
+        subprocess.run([sys.executable, '-c', 'import gtpyhop'], cwd=directory,
+                       stdout=subprocess.DEVNULL, check=True)
+    return run, 1
+
+
+def bench_python_startup():
+    def run():
+        subprocess.run([sys.executable, '-c', 'pass'], stdout=subprocess.DEVNULL, check=True)
+    return run, 1
+
+
+BENCHMARKS = {
+    'state_copy_10': lambda: bench_state_copy(10),
+    'state_copy_100': lambda: bench_state_copy(100),
+    'state_copy_1000': lambda: bench_state_copy(1000),
+    'seek_plan_per_node': lambda: bench_seek_plan_per_node(200),
+    'method_call': lambda: bench_method_call(200),
+    'goals_not_achieved_100': lambda: bench_goals_not_achieved(100),
+    'goals_not_achieved_10000': lambda: bench_goals_not_achieved(10000),
+    'declare': lambda: bench_declare(100),
+    'import_gtpyhop': bench_import,
+    'python_startup': bench_python_startup,
+}
+
+
+################################################################################
+# Running, storing and comparing
+
+
+def measure(function, ops, repeat=7, min_time=0.2):
+    """
+    Time function like timeit does: pick a number of calls that takes at
+    least min_time, then time that many calls 'repeat' times. Returns the
+    median and minimum time per operation, in seconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    while number > 1 and timer.timeit(number) > 4 * min_time:
+        number //= 2
+    times = [t / number / ops for t in timer.repeat(repeat, number)]
+    return {'median': statistics.median(times), 'min': min(times), 'number': number, 'repeat': repeat}
+
+
+def run_benchmarks(names=None, repeat=7):
+    """Run the named benchmarks (all of them by default) and return their results"""
+    old_verbose, old_domain = gtpyhop.verbose, gtpyhop.current_domain
+    old_limit = sys.getrecursionlimit()
+    gtpyhop.verbose = 0
+    sys.setrecursionlimit(max(old_limit, 5000))
+    results = {}
+    try:
+        for name in names or BENCHMARKS:
+            function, ops = BENCHMARKS[name]()
+            results[name] = measure(function, ops, repeat)
+            print(f"{name:<28} {results[name]['median']*1e6:12.3f} us/op")
+    finally:
+        gtpyhop.verbose, gtpyhop.current_domain = old_verbose, old_domain
+        sys.setrecursionlimit(old_limit)
+    if 'import_gtpyhop' in results and 'python_startup' in results:
+        results['import_gtpyhop']['net_median'] = \
+            results['import_gtpyhop']['median'] - results['python_startup']['median']
+    return results
+
+
+def git_commit():
+    """The current commit, with '-dirty' appended if there are uncommitted changes"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=directory, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + '-dirty' if status else commit
+
+
+def load_results(path=RESULTS_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_results(commit, results, path=RESULTS_FILE):
+    """Store results under commit in the JSON file at path, replacing any earlier results for it"""
+    all_results = load_results(path)
+    all_results[commit] = results
+    with open(path, 'w') as f:
+        json.dump(all_results, f, indent=1, sort_keys=True)
+
+
+def _find_commit(all_results, prefix):
+    """The stored commit named by prefix (an exact key, or an unambiguous prefix of one)"""
+    if prefix in all_results:
+        return prefix
+    matches = [c for c in all_results if c.startswith(prefix)]
+    if len(matches) != 1:
+        raise Exception(f"{len(matches)} stored commits match '{prefix}'")
+    return matches[0]
+
+
+# The parameters of synthetic_htn.make_problem, and their defaults
+SWEEP_DEFAULTS = {'branching': 2, 'depth': 4, 'subtasks': 2, 'failure_prob': 0.0,
+                  'state_size': 10, 'write_size': 1, 'unigoal_fraction': 0.0, 'seed': 0}
+
+
+def sweep(parameter, values, repeat=7, **parameters):
+    """
+    For each value of the named make_problem parameter (the other parameters
+    are given as keyword arguments), time find_plan on the synthetic problem
+    and measure its peak memory. Returns a list of (value, number of tasks in
+    the task tree, plan length, median seconds per find_plan, peak bytes).
+    """
+    old_verbose, old_domain = gtpyhop.verbose, gtpyhop.current_domain
+    old_limit = sys.getrecursionlimit()
+    gtpyhop.verbose = 0
+    sys.setrecursionlimit(max(old_limit, 100000))
+    rows = []
+    try:
+        for value in values:
+            parameters[parameter] = value
+            (domain, state, todo_list, expected) = synthetic_htn.make_problem(**parameters)
+            def run():
+                gtpyhop.current_domain = domain
+                return gtpyhop.find_plan(state, todo_list)
+            seconds = measure(run, 1, repeat)['median']
+            tracemalloc.start()
+            plan = run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if plan != expected:
+                raise Exception(f"find_plan returned a wrong plan for {parameter}={value}")
+            tasks = synthetic_htn.tree_size(parameters.get('depth', SWEEP_DEFAULTS['depth']),
+                                            parameters.get('subtasks', SWEEP_DEFAULTS['subtasks']))
+            rows.append((value, tasks, len(plan), seconds, peak_memory))
+    finally:
+        gtpyhop.verbose, gtpyhop.current_domain = old_verbose, old_domain
+        sys.setrecursionlimit(old_limit)
+    return rows
+
+
+def _random_towers(n, rng):
+    """A 'pos' state variable that puts blocks 1..n into random towers"""
+    blocks = list(range(1, n + 1))
+    rng.shuffle(blocks)
+    pos = {}
+    for i, b in enumerate(blocks):
+        pos[b] = 'table' if i == 0 or rng.random() < 0.3 else blocks[i - 1]
+    return pos
+
+
+def blocks_problem(n, seed=0):
+    """A random blocks-world problem with n blocks, as (state, multigoal)"""
+    rng = random.Random(seed)
+    state = gtpyhop.State(f'blocks_{n}_{seed}')
+    state.pos = _random_towers(n, rng)
+    state.above = blocks_goal_splitting.above_from_pos(state.pos)
+    state.clear = {b: not state.above[b] for b in state.pos}
+    state.holding = {'hand': False}
+    goal = gtpyhop.Multigoal(f'blocks_{n}_{seed}_goal')
+    goal.pos = _random_towers(n, rng)
+    return state, goal
+
+
+def _m_make_clear_by_search(state, b2, truth):
+    """m_make_clear as it was before blocks states had an 'above' state variable"""
+    if truth == True:
+        if b2 == 'table' or state.clear[b2]:
+            return []
+        else:
+            above_b2 = [b1 for b1 in state.pos if state.pos[b1] == b2][0]
+            return [('clear',above_b2,True), ('pos',above_b2,'table')]
+
+
+def blocks_scaling(sizes, repeat=3, seed=0):
+    """
+    Time blocks_goal_splitting on a random problem of each size, first with
+    its own m_make_clear and then with _m_make_clear_by_search. Returns a list
+    of (size, plan length, median seconds with 'above', median seconds with
+    search).
+    """
+    domain = blocks_goal_splitting.the_domain
+    methods = domain._unigoal_method_dict['clear']
+    old_verbose, old_domain = gtpyhop.verbose, gtpyhop.current_domain
+    old_limit = sys.getrecursionlimit()
+    gtpyhop.verbose = 0
+    sys.setrecursionlimit(max(old_limit, 100000))
+    rows = []
+    try:
+        gtpyhop.current_domain = domain
+        for n in sizes:
+            state, goal = blocks_problem(n, seed)
+            plan = gtpyhop.find_plan(state, [goal])
+            times = []
+            for clear_method in (methods[0], _m_make_clear_by_search):
+                domain._unigoal_method_dict['clear'] = [clear_method]
+                times.append(measure(lambda: gtpyhop.find_plan(state, [goal]), 1, repeat)['median'])
+            domain._unigoal_method_dict['clear'] = methods
+            rows.append((n, len(plan), times[0], times[1]))
+    finally:
+        domain._unigoal_method_dict['clear'] = methods
+        gtpyhop.verbose, gtpyhop.current_domain = old_verbose, old_domain
+        sys.setrecursionlimit(old_limit)
+    return rows
+
+
+def compare(old, new, threshold=0.10):
+    """
+    Compare two sets of results. Returns a list of (name, old median, new
+    median, ratio, is_regression), where is_regression means the new median
+    is more than 'threshold' (a fraction) slower than the old one.
+    """
+    rows = []
+    for name in old:
+        if name in new:
+            ratio = new[name]['median'] / old[name]['median']
+            rows.append((name, old[name]['median'], new[name]['median'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the GTPyhop engine')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and store the results')
+    run_parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all)')
+    run_parser.add_argument('--repeat', type=int, default=7)
+    run_parser.add_argument('--commit', default=None, help='Store under this key instead of the git commit')
+    run_parser.add_argument('--results', default=RESULTS_FILE)
+    compare_parser = subparsers.add_parser('compare', help='Compare the results of two commits')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Flag slowdowns larger than this fraction (default 0.10)')
+    compare_parser.add_argument('--results', default=RESULTS_FILE)
+    list_parser = subparsers.add_parser('list', help='List the commits that have results')
+    list_parser.add_argument('--results', default=RESULTS_FILE)
+    sweep_parser = subparsers.add_parser('sweep', help='Vary one parameter of the synthetic domains')
+    sweep_parser.add_argument('parameter', choices=SWEEP_DEFAULTS, help='A parameter of synthetic_htn.make_problem')
+    sweep_parser.add_argument('values', nargs='+', type=float)
+    sweep_parser.add_argument('--repeat', type=int, default=7)
+    for name, default in SWEEP_DEFAULTS.items():
+        sweep_parser.add_argument(f'--{name}', type=type(default), default=default)
+    blocks_parser = subparsers.add_parser('blocks', help='Time blocks_goal_splitting as the number of blocks grows')
+    blocks_parser.add_argument('sizes', nargs='+', type=int)
+    blocks_parser.add_argument('--repeat', type=int, default=3)
+    blocks_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        commit = args.commit or git_commit()
+        save_results(commit, run_benchmarks(args.names, args.repeat), args.results)
+        print(f"Stored results for {commit} in {args.results}")
+    elif args.command == 'sweep':
+        parameters = {name: getattr(args, name) for name in SWEEP_DEFAULTS}
+        cast = type(parameters[args.parameter])
+        print(f"{args.parameter:>16} {'tasks':>8} {'plan':>8} {'ms/plan':>12} {'peak KB':>10}")
+        for value, tasks, length, seconds, peak_memory in \
+                sweep(args.parameter, [cast(v) for v in args.values], args.repeat, **parameters):
+            print(f"{value:>16} {tasks:>8} {length:>8} {seconds*1e3:12.3f} {peak_memory/1024:10.1f}")
+    elif args.command == 'blocks':
+        print(f"{'blocks':>8} {'plan':>8} {'above s':>10} {'search s':>10} {'speedup':>8}")
+        for n, length, above_time, search_time in blocks_scaling(args.sizes, args.repeat, args.seed):
+            print(f"{n:>8} {length:>8} {above_time:10.3f} {search_time:10.3f} {search_time/above_time:8.2f}")
+    elif args.command == 'list':
+        for commit in load_results(args.results):
+            print(commit)
+    else:
+        all_results = load_results(args.results)
+        old, new = _find_commit(all_results, args.old), _find_commit(all_results, args.new)
+        rows = compare(all_results[old], all_results[new], args.threshold)
+        print(f"{'benchmark':<28} {'old us/op':>12} {'new us/op':>12} {'ratio':>7}")
+        for name, old_median, new_median, ratio, regression in rows:
+            flag = '  REGRESSION' if regression else ''
+            print(f"{name:<28} {old_median*1e6:12.3f} {new_median*1e6:12.3f} {ratio:7.2f}{flag}")
+        sys.exit(1 if any(row[4] for row in rows) else 0)
@@ -0,0 +1,166 @@
+"""
+Benchmark harness for the HTN trials.
+
+A trial is split into phases (generation, parsing, domain setup, planning)
+that are timed separately. The planning phase is run with GTPyhop's tracing
+turned off, after some untimed warm-up runs, and is repeated so that each
+instance gets a median rather than a single measurement. Peak memory is
+measured with tracemalloc in a separate run, so that tracing allocations
+doesn't slow down the timed runs.
+
+summarize computes the median, interquartile range and a bootstrap
+confidence interval for the median. To see them for each size, e.g.
+    python benchmark.py results_data/results.sqlite sat htn
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GTPyhop'))
+import gtpyhop
+
+
+@contextlib.contextmanager
+def timed(phases, name):
+    """
+    Time the body of a with statement and add the elapsed time to
+    phases[name], e.g.
+        with timed(phases, 'generation'):
+            problem = create_problem()
+    """
+    start_time = timeit.default_timer()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0) + timeit.default_timer() - start_time
+
+
+def _find_plan_quietly(state, todo_list):
+    """Run find_plan with tracing off, restoring the old verbosity afterwards"""
+    old_verbose = gtpyhop.verbose
+    gtpyhop.verbose = 0
+    try:
+        return gtpyhop.find_plan(state, todo_list)
+    finally:
+        gtpyhop.verbose = old_verbose
+
+
+def time_planning(state, todo_list, warmup=1, repeats=5, measure_memory=True, before_each=None):
+    """
+    Plan for todo_list from state warmup times without timing, then repeats
+    times with timing. If before_each isn't None, it is called with no
+    arguments before each run, outside the timed region (e.g., to empty a
+    cache). Returns a dictionary with
+      - 'plan': the plan found by the last run
+      - 'times': the planning time of each timed run, in seconds
+      - 'peak_memory': the peak memory allocated during one more run, in
+        bytes (None if measure_memory is False)
+    """
+    # Methods are allowed to modify the state they're given, so each run gets
+    # its own copy, made outside the timed region.
+    for _ in range(warmup):
+        if before_each:
+            before_each()
+        _find_plan_quietly(state.copy(), list(todo_list))
+    times = []
+    plan = None
+    for _ in range(repeats):
+        if before_each:
+            before_each()
+        run_state, run_todo_list = state.copy(), list(todo_list)
+        start_time = timeit.default_timer()
+        plan = _find_plan_quietly(run_state, run_todo_list)
+        times.append(timeit.default_timer() - start_time)
+    peak_memory = None
+    if measure_memory:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        if before_each:
+            before_each()
+        run_state, run_todo_list = state.copy(), list(todo_list)
+        baseline = tracemalloc.get_traced_memory()[0]
+        _find_plan_quietly(run_state, run_todo_list)
+        peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+        if not was_tracing:
+            tracemalloc.stop()
+    return {'plan': plan, 'times': times, 'peak_memory': peak_memory}
+
+
+################################################################################
+# Statistics
+
+
+def bootstrap_median_ci(samples, confidence=0.95, resamples=2000, seed=0):
+    """
+    Return (low, high), a percentile-bootstrap confidence interval for the
+    median of samples. The resampling uses its own seeded RNG, so the
+    interval is reproducible.
+    """
+    rng = random.Random(seed)
+    n = len(samples)
+    medians = sorted(statistics.median(rng.choices(samples, k=n)) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    low = medians[int(tail * (resamples - 1))]
+    high = medians[int((1 - tail) * (resamples - 1))]
+    return (low, high)
+
+
+def summarize(samples, confidence=0.95, resamples=2000, seed=0):
+    """
+    Return a dictionary with the number of samples, their median, first and
+    third quartiles, interquartile range, and a bootstrap confidence interval
+    for the median.
+    """
+    samples = list(samples)
+    if len(samples) >= 2:
+        q1, _, q3 = statistics.quantiles(samples, n=4)
+    else:
+        q1 = q3 = samples[0]
+    ci_low, ci_high = bootstrap_median_ci(samples, confidence, resamples, seed)
+    return {'n': len(samples), 'median': statistics.median(samples), 'q1': q1, 'q3': q3,
+            'iqr': q3 - q1, 'ci_low': ci_low, 'ci_high': ci_high}
+
+
+def summarize_by_size(connection, domain, planner, code_version=None, confidence=0.95):
+    """
+    Return [(size, summary)] for the solved trials of planner on domain in a
+    results store, where summary is what summarize returns for their times.
+    """
+    query = """
+        SELECT i.size, t.time
+        FROM trials t JOIN instances i ON t.instance_id = i.id
+             JOIN planner_configs c ON t.config_id = c.id
+             JOIN runs r ON t.run_id = r.id
+        WHERE c.domain = ? AND c.planner = ? AND t.outcome = 'solved'"""
+    parameters = [domain, planner]
+    if code_version is not None:
+        query += " AND r.code_version = ?"
+        parameters.append(code_version)
+    times_by_size = {}
+    for size, time in connection.execute(query, parameters):
+        times_by_size.setdefault(size, []).append(time)
+    return [(size, summarize(times_by_size[size], confidence)) for size in sorted(times_by_size)]
+
+
+if __name__ == "__main__":
+    import results_store
+    parser = argparse.ArgumentParser(description="Print timing statistics for each size from a results store")
+    parser.add_argument("store")
+    parser.add_argument("domain", help="block or sat")
+    parser.add_argument("planner", help="htn or domain_independent")
+    parser.add_argument("--code_version", default=None)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    cli_args = parser.parse_args()
+    connection = results_store.connect(cli_args.store)
+    print(f"Size, N, Median, Q1, Q3, IQR, CI Low, CI High")
+    for size, s in summarize_by_size(connection, cli_args.domain, cli_args.planner, cli_args.code_version, cli_args.confidence):
+        print(f"{size}, {s['n']}, {s['median']}, {s['q1']}, {s['q3']}, {s['iqr']}, {s['ci_low']}, {s['ci_high']}")
+    connection.close()
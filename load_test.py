@@ -0,0 +1,122 @@
+"""
+Load test for planning_server.py.
+
+Starts a planning server on a Unix socket (or uses the one at --address),
+and sends it --requests requests from --concurrency client threads, each
+with its own connection. Each request is a batch of --batch random
+blocks-world problems with --blocks blocks. Prints the number of requests
+per second and the median and 99th percentile of the request latency, e.g.
+    python load_test.py --requests 500 --concurrency 8 --workers 4
+"""
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import planning_server
+from planning_server import gtpyhop
+
+
+def random_blocks_problem(n, seed):
+    """A random blocks_htn problem: some towers of blocks 1..n, to be put on the table"""
+    rng = random.Random(seed)
+    blocks = list(range(1, n + 1))
+    rng.shuffle(blocks)
+    pos = {}
+    for (below, b) in zip([None] + blocks, blocks):
+        pos[b] = below if below is not None and rng.random() < 0.7 else 'table'
+    above = {b: False for b in blocks}
+    above.update({p: b for b, p in pos.items() if p != 'table'})
+    state = gtpyhop.State(f'state{seed}', pos=pos, clear={b: not above[b] for b in blocks},
+                          holding={'hand': False}, above=above)
+    goal = gtpyhop.Multigoal(f'goal{seed}', pos={b: 'table' for b in blocks})
+    return (state, [('achieve', goal)])
+
+
+def percentile(samples, p):
+    """The p'th percentile of a list of numbers (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run_clients(address, requests, concurrency, batch, blocks):
+    """Send the requests from concurrency threads, and return (elapsed time, latencies)"""
+    problems = [planning_server.encode_problem("blocks", *random_blocks_problem(blocks, seed), seed)
+                for seed in range(requests * batch)]
+    latencies = []
+    next_request = iter(range(requests))
+    lock = threading.Lock()
+
+    def client_thread():
+        with planning_server.PlanningClient(address) as client:
+            while True:
+                with lock:
+                    i = next(next_request, None)
+                if i is None:
+                    return
+                start_time = timeit.default_timer()
+                results = list(client.plan_batch(problems[i*batch:(i+1)*batch]))
+                latency = timeit.default_timer() - start_time
+                if len(results) != batch or any(not r.get("plan") for r in results):
+                    raise Exception(f"request {i} failed: {results}")
+                with lock:
+                    latencies.append(latency)
+
+    threads = [threading.Thread(target=client_thread) for t in range(concurrency)]
+    start_time = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timeit.default_timer() - start_time, latencies
+
+
+def start_server(workers, batch_size):
+    """Start a planning server on a new Unix socket; return (process, address)"""
+    address = os.path.join(tempfile.mkdtemp(), "planning_server.sock")
+    command = [sys.executable, os.path.join(planning_server.ROOT, "planning_server.py"),
+               "--unix", address, "--batch_size", str(batch_size)]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command)
+    while not os.path.exists(address):
+        if process.poll() is not None:
+            raise Exception("the planning server didn't start")
+        time.sleep(0.05)
+    return process, address
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of a planning server")
+    parser.add_argument("--address", default=None, help="A running server's Unix socket or localhost port (default: start one)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of client threads")
+    parser.add_argument("--batch", type=int, default=1, help="Number of problems per request")
+    parser.add_argument("--blocks", type=int, default=10, help="Number of blocks in each problem")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for the server that is started")
+    parser.add_argument("--batch_size", type=int, default=1, help="Chunk size for the server that is started")
+    cli_args = parser.parse_args()
+    process = None
+    if cli_args.address is None:
+        process, address = start_server(cli_args.workers, cli_args.batch_size)
+    elif cli_args.address.isdigit():
+        address = ("localhost", int(cli_args.address))
+    else:
+        address = cli_args.address
+    try:
+        elapsed, latencies = run_clients(address, cli_args.requests, cli_args.concurrency,
+                                         cli_args.batch, cli_args.blocks)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(f"{len(latencies)} requests in {elapsed:.2f} s: {len(latencies) / elapsed:.1f} requests/s")
+    print(f"latency: median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
@@ -0,0 +1,232 @@
+"""
+Driver for running the Metric-FF planner on generated problems.
+
+Each call to run_ff writes its problem to a private temporary file (on
+/dev/shm when it is available, so the problem never touches the disk) and
+runs Metric-FF/ff on it under a wall-clock limit and an address-space limit.
+Because no two trials share a file, several runs can proceed in parallel.
+
+parse_ff_output turns what ff prints into an FFResult record, by matching
+ff's messages rather than counting lines from the end of the output.
+"""
+
+import collections
+import os
+import re
+import resource
+import signal
+import subprocess
+import tempfile
+import timeit
+
+FF_PATH = "Metric-FF/ff"
+
+# Prefer a RAM-backed directory for the problem files when the machine has one.
+TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+# Outcomes of a single Metric-FF run.
+FINISHED = "finished"
+TIMEOUT = "timeout"
+OUT_OF_MEMORY = "out_of_memory"
+CRASHED = "crashed"
+
+# What ff (or the loader) prints when an allocation fails under the memory limit;
+# ff's own check (in ff.h) prints "NO MEMORY in file ...".
+_MEMORY_MESSAGES = ["NO MEMORY", "failed to map segment", "Cannot allocate memory",
+                    "memory exhausted", "MemoryError", "malloc"]
+
+# Signals that an allocation failing under the memory limit can cause: ff
+# doesn't check what calloc returns everywhere, so it usually crashes with
+# SIGSEGV (before it flushes its output), and glibc aborts on some failures.
+_MEMORY_SIGNALS = {signal.SIGSEGV, signal.SIGBUS, signal.SIGABRT}
+
+FFRun = collections.namedtuple("FFRun", ["outcome", "wall_time", "returncode", "output"])
+FFRun.__doc__ = """
+The result of one Metric-FF run:
+    - outcome is FINISHED, TIMEOUT, OUT_OF_MEMORY or CRASHED
+    - wall_time is the elapsed wall-clock time of the subprocess, in seconds
+    - returncode is ff's exit status (None if it was killed for a timeout)
+    - output is everything ff printed on stdout
+"""
+
+
+def _limit_memory(memory_limit):
+    """Return a preexec_fn that caps the child's address space at memory_limit MB"""
+    def set_limit():
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return set_limit
+
+
+def _out_of_memory(returncode, output):
+    """Whether a run under a memory limit that failed with returncode and output ran out of memory"""
+    if any(message in output for message in _MEMORY_MESSAGES):
+        return True
+    return returncode < 0 and -returncode in _MEMORY_SIGNALS
+
+
+def run_ff(domain_file, problem, options=(), timeout=None, memory_limit=None):
+    """
+    Run Metric-FF on a problem and return an FFRun. Arguments:
+      - domain_file is the path of the PDDL domain file
+      - problem is the text of the PDDL problem
+      - options are extra command-line arguments for ff, e.g. ("-E", "-g", "1")
+      - timeout is the wall-clock limit in seconds (None for no limit)
+      - memory_limit is the address-space limit in megabytes (None for no limit)
+    """
+    with tempfile.NamedTemporaryFile("w", prefix="ff_problem_", suffix=".pddl",
+                                     dir=TEMP_DIR, delete=False) as f:
+        f.write(problem)
+        problem_file = f.name
+    command = [FF_PATH, "-o", domain_file, "-f", problem_file, *options]
+    preexec_fn = _limit_memory(memory_limit) if memory_limit else None
+    start_time = timeit.default_timer()
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, timeout=timeout, preexec_fn=preexec_fn)
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout or ""
+        if isinstance(output, bytes):
+            output = output.decode(errors="replace")
+        return FFRun(TIMEOUT, timeit.default_timer() - start_time, None, output)
+    finally:
+        os.remove(problem_file)
+    wall_time = timeit.default_timer() - start_time
+    if completed.returncode == 0:
+        outcome = FINISHED
+    elif memory_limit and _out_of_memory(completed.returncode, completed.stdout):
+        outcome = OUT_OF_MEMORY
+    else:
+        outcome = CRASHED
+    return FFRun(outcome, wall_time, completed.returncode, completed.stdout)
+
+
+# Outcomes of a parsed Metric-FF run (TIMEOUT and OUT_OF_MEMORY come from run_ff).
+SOLVED = "solved"
+UNSOLVABLE = "unsolvable"
+ERROR = "error"
+
+FFResult = collections.namedtuple("FFResult", [
+    "outcome", "failure_reason", "wall_time", "plan", "plan_length",
+    "states_evaluated", "max_search_depth",
+    "instantiation_time", "reachability_time", "final_representation_time",
+    "lnf_time", "connectivity_time", "preprocessing_time", "search_time", "total_time",
+    "easy_templates", "hard_templates", "facts", "actions", "relevant_facts", "relevant_fluents"])
+FFResult.__doc__ = """
+Everything that one Metric-FF run reports:
+    - outcome is SOLVED, UNSOLVABLE, ERROR, TIMEOUT or OUT_OF_MEMORY
+    - failure_reason is ff's explanation when no plan was found, else None
+    - wall_time is the wall-clock time measured around the subprocess
+    - plan is the list of actions, as lowercase tuples like ('pick-up', 'b1')
+    - plan_length, states_evaluated and max_search_depth are search counters
+    - the *_time fields are ff's own timing breakdown, in seconds;
+      preprocessing_time is everything before the search. When ff finds
+      that the goal is trivially true, it prints no timings, and total_time
+      is the wall_time instead
+    - the remaining fields are the sizes ff reports for the grounded task
+Fields that ff did not print are None.
+"""
+
+# Messages ff prints when it stops without a plan, and the outcome each one means.
+_FAILURE_MESSAGES = [
+    ("goal can be simplified to FALSE", UNSOLVABLE),
+    ("problem proven unsolvable", UNSOLVABLE),
+    ("increase MAX_PLAN_LENGTH", ERROR),
+    ("this is not an ADL problem", ERROR),
+    ("This is not a linear task", ERROR),
+    ("two input files needed", ERROR),
+    ("unknown option", ERROR),
+]
+
+_TIMING_PATTERNS = {
+    "instantiation": re.compile(r"([\d.]+) seconds instantiating (\d+) easy, (\d+) hard action templates"),
+    "reachability": re.compile(r"([\d.]+) seconds reachability analysis, yielding (\d+) facts and (\d+) actions"),
+    "final_representation": re.compile(r"([\d.]+) seconds creating final representation with (\d+) relevant facts, (\d+) relevant fluents"),
+    "lnf": re.compile(r"([\d.]+) seconds computing LNF"),
+    "connectivity": re.compile(r"([\d.]+) seconds building connectivity graph"),
+    "search": re.compile(r"([\d.]+) seconds searching, evaluating (\d+) states, to a max depth of (\d+)"),
+    "total": re.compile(r"([\d.]+) seconds total time"),
+}
+
+_PLAN_STEP = re.compile(r"^\s*(?:step)?\s*(\d+): (.+)$")
+
+
+def _parse_plan(lines):
+    """Return the plan that follows ff's 'found legal plan' line, or None if there isn't one"""
+    for i, line in enumerate(lines):
+        if "found legal plan as follows" in line:
+            break
+    else:
+        return None
+    plan = []
+    for line in lines[i+1:]:
+        if line.strip().startswith("time spent"):
+            break
+        match = _PLAN_STEP.match(line)
+        if match:
+            plan.append(tuple(match.group(2).lower().split()))
+    return plan
+
+
+def parse_ff_output(output, wall_time=None):
+    """
+    Parse the text that ff printed and return an FFResult. If the output is
+    cut short (e.g., the run was killed), the fields that are missing are None.
+
+    For example, ff exits with status 1 and no timings when the goal is already
+    true, so the total time is the wall-clock time:
+    >>> result = parse_ff_output("ff: goal can be simplified to TRUE. The empty plan solves it", 0.25)
+    >>> result.outcome, result.plan, result.plan_length, result.total_time
+    ('solved', [], 0, 0.25)
+    """
+    lines = output.splitlines()
+    fields = dict.fromkeys(FFResult._fields)
+    fields["wall_time"] = wall_time
+    for name, pattern in _TIMING_PATTERNS.items():
+        match = pattern.search(output)
+        if match:
+            fields[f"{name}_time"] = float(match.group(1))
+            numbers = [int(x) for x in match.groups()[1:]]
+            if name == "instantiation":
+                fields["easy_templates"], fields["hard_templates"] = numbers
+            elif name == "reachability":
+                fields["facts"], fields["actions"] = numbers
+            elif name == "final_representation":
+                fields["relevant_facts"], fields["relevant_fluents"] = numbers
+            elif name == "search":
+                fields["states_evaluated"], fields["max_search_depth"] = numbers
+    stages = ["instantiation_time", "reachability_time", "final_representation_time", "lnf_time", "connectivity_time"]
+    if all(fields[stage] is not None for stage in stages):
+        fields["preprocessing_time"] = sum(fields[stage] for stage in stages)
+
+    plan = _parse_plan(lines)
+    if plan is None and "goal can be simplified to TRUE" in output:
+        plan = []
+        if fields["total_time"] is None:
+            fields["total_time"] = wall_time
+    if plan is not None:
+        fields["outcome"] = SOLVED
+        fields["plan"] = plan
+        fields["plan_length"] = len(plan)
+        return FFResult(**fields)
+    for message, outcome in _FAILURE_MESSAGES:
+        if message in output:
+            fields["outcome"] = outcome
+            fields["failure_reason"] = message
+            return FFResult(**fields)
+    fields["outcome"] = ERROR
+    fields["failure_reason"] = "no plan and no recognized failure message"
+    return FFResult(**fields)
+
+
+def ff_result(ff_run):
+    """
+    Return the FFResult for an FFRun from run_ff. Timeouts and memory outs keep
+    those outcomes; whatever ff printed before it was stopped is still parsed.
+    """
+    result = parse_ff_output(ff_run.output, ff_run.wall_time)
+    if ff_run.outcome in (TIMEOUT, OUT_OF_MEMORY):
+        return result._replace(outcome=ff_run.outcome, failure_reason=ff_run.outcome, plan=None, plan_length=None)
+    if ff_run.outcome == CRASHED and result.outcome == ERROR:
+        return result._replace(failure_reason=f"ff exited with status {ff_run.returncode}")
+    return result
@@ -0,0 +1,310 @@
+"""
+A long-lived planning server, so that planning requests don't pay for
+starting Python, importing GTPyhop, and executing the domain modules.
+
+The server listens on a localhost TCP port or a Unix socket. Each worker
+process in its pool imports the domains in DOMAIN_MODULES once, when it
+starts, and then plans for as many problems as it is given. Start it with
+    python planning_server.py --port 8765 --workers 4
+or
+    python planning_server.py --unix /tmp/gtpyhop.sock
+
+The protocol is one JSON object per line, in both directions. A request is
+either one problem or a batch of them:
+    {"domain": "sat", "state": ..., "todo_list": [...], "id": ...}
+    {"problems": [problem, problem, ...]}
+where the state and todo list are encoded by encode (the "id" is optional,
+and is sent back with the result). The server splits a batch into chunks of
+--batch_size problems, gives the chunks to the workers, and sends back one
+line per problem as soon as its chunk is done:
+    {"index": i, "id": ..., "plan": [...], "stats": {...}}
+where stats has the planning time and the worker's process id, followed by
+    {"done": true, "problems": n, "time": seconds}
+A problem that can't be solved has "plan": false, and one that raised an
+exception, or isn't a JSON object, has "error" instead of "plan". A request
+that isn't valid JSON, or isn't a JSON object, gets {"error": ...} and then
+the "done" line.
+
+Batching only splits the problems of one request into chunks: problems from
+separate requests (or connections) are never put in the same chunk, so a
+client that wants the per-chunk savings should send its problems together.
+
+PlanningClient is the client side, e.g.
+    client = PlanningClient(("localhost", 8765))
+    plan = client.plan("sat", state, [("achieve", goal)])
+and load_test.py measures the server's throughput and latency.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import timeit
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'GTPyhop'))
+sys.path.append(os.path.join(ROOT, 'GTPyhop', 'Examples'))
+with contextlib.redirect_stdout(io.StringIO()):
+    import gtpyhop
+
+DEFAULT_PORT = 8765
+
+# The modules to import for each domain, in order. A domain is whatever
+# gtpyhop.current_domain is after its modules have been imported.
+DOMAIN_MODULES = {
+    "sat": ["sat_htn.actions", "sat_htn.methods"],
+    "blocks": ["blocks_htn"],
+}
+
+
+###############################################################################
+# Encoding states, multigoals and todo lists as JSON
+
+
+def encode(x):
+    """
+    Return a JSON-compatible version of x, which may contain states,
+    multigoals, tuples, sets, frozensets, dicts (with any hashable keys),
+    lists, strings, numbers, booleans and None. decode reverses it.
+    """
+    if isinstance(x, gtpyhop.State):
+        return {"state": x.__name__, "vars": {v: encode(vars(x)[v]) for v in x.state_vars()}}
+    if isinstance(x, gtpyhop.Multigoal):
+        return {"multigoal": x.__name__, "vars": {v: encode(vars(x)[v]) for v in x.state_vars()}}
+    if isinstance(x, tuple):
+        return {"tuple": [encode(y) for y in x]}
+    if isinstance(x, (set, frozenset)):
+        return {type(x).__name__: [encode(y) for y in x]}
+    if isinstance(x, dict):
+        return {"dict": [[encode(k), encode(v)] for k, v in x.items()]}
+    if isinstance(x, list):
+        return [encode(y) for y in x]
+    return x
+
+
+def decode(x):
+    """The inverse of encode"""
+    if isinstance(x, list):
+        return [decode(y) for y in x]
+    if not isinstance(x, dict):
+        return x
+    if "tuple" in x:
+        return tuple(decode(y) for y in x["tuple"])
+    if "set" in x:
+        return {decode(y) for y in x["set"]}
+    if "frozenset" in x:
+        return frozenset(decode(y) for y in x["frozenset"])
+    if "dict" in x:
+        return {decode(k): decode(v) for k, v in x["dict"]}
+    if "state" in x:
+        return gtpyhop.State(x["state"], **{v: decode(value) for v, value in x["vars"].items()})
+    return gtpyhop.Multigoal(x["multigoal"], **{v: decode(value) for v, value in x["vars"].items()})
+
+
+def encode_problem(domain, state, todo_list, problem_id=None):
+    """The JSON object for a problem"""
+    problem = {"domain": domain, "state": encode(state), "todo_list": encode(todo_list)}
+    if problem_id is not None:
+        problem["id"] = problem_id
+    return problem
+
+
+###############################################################################
+# The worker processes
+
+_domains = {}
+
+
+def _load_domains(names):
+    """Import the modules for the named domains (run once in each worker)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in names:
+            gtpyhop.Domain(name)
+            for module in DOMAIN_MODULES[name]:
+                importlib.import_module(module)
+            _domains[name] = gtpyhop.current_domain
+
+
+def _plan_chunk(problems):
+    """Plan for each of a list of JSON problems, and return the list of results"""
+    results = []
+    for problem in problems:
+        if not isinstance(problem, dict):
+            results.append({"id": None, "error": f"bad problem: {problem!r} isn't a JSON object"})
+            continue
+        result = {"id": problem.get("id")}
+        start_time = timeit.default_timer()
+        if problem.get("domain") not in _domains:
+            result["error"] = f"unknown domain {problem.get('domain')!r}"
+            results.append(result)
+            continue
+        try:
+            planner = gtpyhop.Planner(_domains[problem["domain"]], verbose=0)
+            plan = planner.find_plan(decode(problem["state"]), decode(problem["todo_list"]))
+            result["plan"] = encode(plan)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["stats"] = {"time": timeit.default_timer() - start_time, "worker": os.getpid()}
+        results.append(result)
+    return results
+
+
+###############################################################################
+# The server
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handles the requests that arrive on one connection, one at a time"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start_time = timeit.default_timer()
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self._send_error(f"bad request: {e}", start_time)
+                continue
+            if not isinstance(request, dict):
+                self._send_error("bad request: it isn't a JSON object", start_time)
+                continue
+            problems = request["problems"] if "problems" in request else [request]
+            if not isinstance(problems, list):
+                self._send_error('bad request: "problems" isn\'t a list', start_time)
+                continue
+            size = self.server.batch_size
+            futures = {self.server.pool.submit(_plan_chunk, problems[i:i+size]): i
+                       for i in range(0, len(problems), size)}
+            for future in as_completed(futures):
+                for offset, result in enumerate(future.result()):
+                    self._send(dict(result, index=futures[future] + offset))
+            self._send({"done": True, "problems": len(problems),
+                        "time": timeit.default_timer() - start_time})
+
+    def _send_error(self, error, start_time):
+        """Answer a request that can't be planned for"""
+        self._send({"error": error})
+        self._send({"done": True, "problems": 0, "time": timeit.default_timer() - start_time})
+
+    def _send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _interrupt(signal_number, frame):
+    raise KeyboardInterrupt
+
+
+def serve(address, workers=None, batch_size=1, domains=tuple(DOMAIN_MODULES)):
+    """
+    Run a planning server until it is interrupted (by SIGINT or SIGTERM).
+    address is a port number (on localhost) or the path of a Unix socket.
+    """
+    signal.signal(signal.SIGTERM, _interrupt)
+    workers = workers or os.cpu_count()
+    pool = ProcessPoolExecutor(workers, initializer=_load_domains, initargs=(list(domains),))
+    # start the workers now, so that the first requests don't wait for them
+    for future in [pool.submit(os.getpid) for i in range(workers)]:
+        future.result()
+    if isinstance(address, int):
+        server = _TCPServer(("localhost", address), _RequestHandler)
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = _UnixServer(address, _RequestHandler)
+    server.pool = pool
+    server.batch_size = batch_size
+    print(f"Planning server for {', '.join(domains)} on {address}, "
+          f"{workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+        if not isinstance(address, int):
+            os.remove(address)
+
+
+###############################################################################
+# The client
+
+
+class PlanningClient():
+    """
+    client = PlanningClient(address) connects to a planning server. address
+    is (host, port) or the path of a Unix socket. A client can be used by
+    one thread at a time, and should be closed (or used in a with statement)
+    when it is no longer needed.
+    """
+
+    def __init__(self, address):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        self.file = self.socket.makefile("rwb")
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def plan_batch(self, problems):
+        """
+        Send a list of JSON problems (see encode_problem), and yield each
+        result as it arrives, with the plan decoded. The results may come
+        in any order; result["index"] is the problem's position in the list.
+        """
+        self.file.write(json.dumps({"problems": problems}).encode() + b"\n")
+        self.file.flush()
+        for line in self.file:
+            result = json.loads(line)
+            if result.get("done"):
+                return
+            if "plan" in result:
+                result["plan"] = decode(result["plan"])
+            yield result
+
+    def plan(self, domain, state, todo_list):
+        """Return the plan that find_plan would return in the server's domain"""
+        [result] = self.plan_batch([encode_problem(domain, state, todo_list)])
+        if "error" in result:
+            raise Exception(f"planning server: {result['error']}")
+        return result["plan"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a planning server with preloaded domains")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="The localhost TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--batch_size", type=int, default=1, help="Number of problems from a batch to give a worker at a time")
+    parser.add_argument("--domains", nargs="+", default=list(DOMAIN_MODULES), choices=list(DOMAIN_MODULES))
+    cli_args = parser.parse_args()
+    serve(cli_args.unix or cli_args.port, cli_args.workers, cli_args.batch_size, cli_args.domains)
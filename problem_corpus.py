@@ -0,0 +1,82 @@
+"""
+A content-addressed cache of generated planning problems.
+
+Each problem is identified by a hash of the generator's name, the problem
+size, the generator's parameters and the seed. The corpus keeps two forms of
+each problem: the PDDL text that Metric-FF reads, and the native form that
+the HTN planner uses (e.g., a GTPyhop state and goal), pickled so that it can
+be loaded without any parsing. The HTN and domain-independent planners ask
+for the same keys, so they run on identical instances, and reruns load the
+problems instead of generating them again.
+
+Files are written to a temporary name and then renamed, so several
+processes can share a corpus directory.
+
+The native form depends on how the planner's domain represents states, so
+its file name includes a version number. When that representation changes
+(e.g., a new state variable), bump the version: the old pickles are then
+ignored, and the problems are rebuilt from the same seeds.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+DEFAULT_PATH = "problem_corpus"
+
+PDDL = "pddl"
+NATIVE = "native"
+
+
+def corpus_key(generator, size, params, seed):
+    """The hash that identifies a generated problem"""
+    description = json.dumps([generator, size, params, seed], sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class ProblemCorpus():
+    """
+    corpus = ProblemCorpus(path, native_version) uses (and creates if
+    necessary) the corpus directory at path, reading and writing version
+    native_version of the native form. corpus.get(...) returns one form of a problem,
+    building and storing both forms the first time the problem is asked for.
+    The counters corpus.hits and corpus.misses say how often that happened.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, native_version=1):
+        self.path = path
+        self.native_version = native_version
+        os.makedirs(path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key, form):
+        extension = {PDDL: "pddl", NATIVE: f"v{self.native_version}.pickle"}[form]
+        return os.path.join(self.path, key[:2], f"{key}.{extension}")
+
+    def _write(self, file_name, data):
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(file_name), delete=False) as f:
+            f.write(data)
+        os.replace(f.name, file_name)
+
+    def get(self, generator, size, params, seed, build, form=NATIVE):
+        """
+        Return the given form (PDDL or NATIVE) of the problem identified by
+        generator, size, params and seed. If the corpus doesn't have it yet,
+        build() is called; it must return (pddl_text, native_problem).
+        """
+        key = corpus_key(generator, size, params, seed)
+        file_name = self._file(key, form)
+        if os.path.exists(file_name):
+            self.hits += 1
+            with open(file_name, "rb") as f:
+                data = f.read()
+            return data.decode() if form == PDDL else pickle.loads(data)
+        self.misses += 1
+        pddl_text, native_problem = build()
+        self._write(self._file(key, PDDL), pddl_text.encode())
+        self._write(self._file(key, NATIVE), pickle.dumps(native_problem, pickle.HIGHEST_PROTOCOL))
+        return pddl_text if form == PDDL else native_problem
@@ -0,0 +1,405 @@
+"""
+A self-contained SQLite store for experiment results.
+
+Every trial is recorded together with the instance it was run on (generator,
+parameters and seed), the planner configuration, the host, and the run it
+belongs to (code version, command line and master seed). Trials are buffered
+and written in batches, so the store adds next to nothing to a sweep.
+
+The legacy CSV layouts in results_data/ can be produced with export_csv, e.g.
+    python results_store.py export results_data/results.sqlite sat htn results_data/sat_htn.csv
+
+The store registers a median() aggregate, so questions like "median time by
+size for commit X" are a single query; see median_time_by_size. Trials of
+different configurations of a planner (e.g., HTN planning with and without
+a method cache) have different config ids; list them with
+    python results_store.py configs results_data/results.sqlite
+and pass --config_id to median (or --config_a/--config_b to paired) to
+keep them apart.
+
+Stores written by different machines (e.g., the shards of one sweep) can be
+combined with merge_stores:
+    python results_store.py merge results_data/results.sqlite shard0.sqlite shard1.sqlite
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_PATH = "results_data/results.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY,
+    hostname TEXT, platform TEXT, machine TEXT, processor TEXT,
+    cpu_count INTEGER, python_version TEXT,
+    UNIQUE (hostname, platform, machine, processor, cpu_count, python_version)
+);
+CREATE TABLE IF NOT EXISTS planner_configs (
+    id INTEGER PRIMARY KEY,
+    planner TEXT, domain TEXT, options TEXT,
+    UNIQUE (planner, domain, options)
+);
+CREATE TABLE IF NOT EXISTS instances (
+    id INTEGER PRIMARY KEY,
+    domain TEXT, generator TEXT, size INTEGER, params TEXT, seed REAL,
+    UNIQUE (domain, generator, size, params, seed)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT, code_version TEXT, command TEXT, seed INTEGER,
+    host_id INTEGER REFERENCES hosts(id)
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER REFERENCES runs(id),
+    instance_id INTEGER REFERENCES instances(id),
+    config_id INTEGER REFERENCES planner_configs(id),
+    repeat INTEGER,
+    outcome TEXT,
+    time REAL,
+    wall_time REAL,
+    search_time REAL,
+    preprocessing_time REAL,
+    states_explored INTEGER,
+    plan_length INTEGER,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS trials_by_instance ON trials (instance_id);
+CREATE INDEX IF NOT EXISTS trials_by_config ON trials (config_id);
+"""
+
+# The columns a trial can have, apart from the foreign keys.
+TRIAL_FIELDS = ["repeat", "outcome", "time", "wall_time", "search_time", "preprocessing_time",
+                "states_explored", "plan_length", "details"]
+
+
+class _Median():
+    """SQLite aggregate that computes the median of its non-NULL inputs"""
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        return statistics.median(self.values) if self.values else None
+
+
+def connect(path=DEFAULT_PATH):
+    """Open (creating if necessary) the store at path and return the connection"""
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    connection.create_aggregate("median", 1, _Median)
+    return connection
+
+
+def code_version():
+    """The current git commit, with '-dirty' appended if there are uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if status else commit
+
+
+def host_info():
+    """A description of the machine that the trials are running on"""
+    return {"hostname": socket.gethostname(), "platform": platform.platform(),
+            "machine": platform.machine(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count(), "python_version": platform.python_version()}
+
+
+def _get_or_insert(connection, table, values):
+    """Return the id of the row of table with the given values, inserting it if needed"""
+    columns = list(values)
+    where = " AND ".join(f"{c} IS ?" for c in columns)
+    row = connection.execute(f"SELECT id FROM {table} WHERE {where}", [values[c] for c in columns]).fetchone()
+    if row:
+        return row[0]
+    cursor = connection.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                [values[c] for c in columns])
+    return cursor.lastrowid
+
+
+class ResultsStore():
+    """
+    store = ResultsStore(path, seed) opens the store at path and starts a new
+    run in it, recording the code version, command line, seed and host.
+    Use store.add_trial(...) for each trial and store.close() at the end (or
+    use the store as a context manager). Trials are written batch_size at a
+    time, or after flush_interval seconds, whichever comes first, so a sweep
+    that dies loses at most that much work.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, seed=None, batch_size=500, flush_interval=30):
+        self.connection = connect(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.monotonic()
+        with self.connection:
+            host_id = _get_or_insert(self.connection, "hosts", host_info())
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at, code_version, command, seed, host_id) VALUES (?, ?, ?, ?, ?)",
+                (datetime.datetime.now().isoformat(timespec="seconds"), code_version(),
+                 " ".join(sys.argv), seed, host_id))
+        self.run_id = cursor.lastrowid
+        self._config_ids = {}
+        self._instance_ids = {}
+
+    def config_id(self, planner, domain, options=None):
+        """Return the id of a planner configuration; options is any JSON-serializable value"""
+        key = (planner, domain, json.dumps(options, sort_keys=True))
+        if key not in self._config_ids:
+            with self.connection:
+                self._config_ids[key] = _get_or_insert(self.connection, "planner_configs",
+                    {"planner": planner, "domain": domain, "options": key[2]})
+        return self._config_ids[key]
+
+    def instance_id(self, domain, generator, size, params, seed):
+        """Return the id of a generated problem instance; params is any JSON-serializable value"""
+        key = (domain, generator, size, json.dumps(params, sort_keys=True), seed)
+        if key not in self._instance_ids:
+            with self.connection:
+                self._instance_ids[key] = _get_or_insert(self.connection, "instances",
+                    {"domain": domain, "generator": generator, "size": size, "params": key[3], "seed": seed})
+        return self._instance_ids[key]
+
+    def add_trial(self, instance_id, config_id, **fields):
+        """
+        Buffer one trial. The keyword arguments are columns from TRIAL_FIELDS;
+        'details' may be any JSON-serializable value.
+        """
+        unknown = set(fields) - set(TRIAL_FIELDS)
+        if unknown:
+            raise Exception(f"add_trial: unknown trial fields {sorted(unknown)}")
+        if "details" in fields:
+            fields["details"] = json.dumps(fields["details"], sort_keys=True)
+        self._pending.append([self.run_id, instance_id, config_id] + [fields.get(f) for f in TRIAL_FIELDS])
+        if len(self._pending) >= self.batch_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered trials in one transaction"""
+        if self._pending:
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT INTO trials (run_id, instance_id, config_id, {', '.join(TRIAL_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(TRIAL_FIELDS) + 3))})", self._pending)
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def completed_trials(self, config_id):
+        """
+        Return the set of (size, params, seed, repeat) for every trial of the
+        planner configuration config_id that is already in the store, from
+        any run and with any outcome. params is the JSON text used by
+        instance_id.
+        """
+        self.flush()
+        return set(self.connection.execute("""
+            SELECT i.size, i.params, i.seed, t.repeat
+            FROM trials t JOIN instances i ON t.instance_id = i.id
+            WHERE t.config_id = ?""", (config_id,)))
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+################################################################################
+# Queries and export
+
+
+def planner_configs(connection):
+    """Return [(config id, planner, domain, options)] for every planner configuration"""
+    return connection.execute("SELECT id, planner, domain, options FROM planner_configs ORDER BY id").fetchall()
+
+
+def median_time_by_size(connection, domain, planner, code_version=None, config_id=None):
+    """
+    Return [(size, median time, number of trials)] for solved trials,
+    optionally for one commit and one planner configuration
+    """
+    query = """
+        SELECT i.size, median(t.time), count(*)
+        FROM trials t JOIN instances i ON t.instance_id = i.id
+             JOIN planner_configs c ON t.config_id = c.id
+             JOIN runs r ON t.run_id = r.id
+        WHERE c.domain = ? AND c.planner = ? AND t.outcome = 'solved'"""
+    parameters = [domain, planner]
+    if code_version is not None:
+        query += " AND r.code_version = ?"
+        parameters.append(code_version)
+    if config_id is not None:
+        query += " AND t.config_id = ?"
+        parameters.append(config_id)
+    query += " GROUP BY i.size ORDER BY i.size"
+    return connection.execute(query, parameters).fetchall()
+
+
+def paired_times(connection, domain, planner_a="htn", planner_b="domain_independent",
+                 config_a=None, config_b=None):
+    """
+    Return [(size, seed, time_a, time_b)] for every instance on which both
+    planners have a solved trial, using the median time of each planner's
+    trials on that instance. config_a and config_b optionally restrict each
+    side to one planner configuration.
+    """
+    return connection.execute("""
+        SELECT i.size, i.seed, a.time, b.time
+        FROM instances i
+             JOIN (SELECT t.instance_id, median(t.time) AS time FROM trials t JOIN planner_configs c ON t.config_id = c.id
+                   WHERE c.planner = ? AND (? IS NULL OR c.id = ?) AND t.outcome = 'solved'
+                   GROUP BY t.instance_id) a ON a.instance_id = i.id
+             JOIN (SELECT t.instance_id, median(t.time) AS time FROM trials t JOIN planner_configs c ON t.config_id = c.id
+                   WHERE c.planner = ? AND (? IS NULL OR c.id = ?) AND t.outcome = 'solved'
+                   GROUP BY t.instance_id) b ON b.instance_id = i.id
+        WHERE i.domain = ?
+        ORDER BY i.size, i.seed""",
+        (planner_a, config_a, config_a, planner_b, config_b, config_b, domain)).fetchall()
+
+
+# Header and row format of each legacy CSV file, keyed by (domain, planner).
+LEGACY_LAYOUTS = {
+    ("block", "htn"): ("Number of Blocks, Time, Plan Length",
+                       "{size}, {time}, {plan_length}"),
+    ("block", "domain_independent"): ("Number of Blocks, Time, Time Units, States Explored, Plan Length",
+                                      "{size}, {time:.2f}, seconds, {states_explored}, {plan_length}"),
+    ("sat", "htn"): ("Number of Targets, Time, Plan Length, Num Satellites, Num Modes, Num Instruments, Num Observations",
+                     "{size}, {time}, {plan_length}, {p[0]}, {p[1]}, {p[2]}, {p[3]}"),
+    ("sat", "domain_independent"): ("Number of Targets, Time, Time Units, States Explored, Plan Length, Num Satellites, Num Modes, Num Instruments, Num Observations",
+                                    "{size}, {time:.2f}, seconds, {states_explored}, {plan_length}, {p[0]}, {p[1]}, {p[2]}, {p[3]}"),
+}
+
+
+class _EmptyField:
+    """A value missing from a CSV row, which formats as an empty field whatever the format spec"""
+    def __format__(self, format_spec):
+        return ""
+
+
+def export_csv(connection, domain, planner, path):
+    """
+    Write the solved trials for domain and planner to path in the legacy CSV layout.
+    A trial without a time gets its wall-clock time, and values that are still
+    missing are left empty.
+    """
+    header, row_format = LEGACY_LAYOUTS[(domain, planner)]
+    rows = connection.execute("""
+        SELECT i.size, i.params, COALESCE(t.time, t.wall_time), t.states_explored, t.plan_length
+        FROM trials t JOIN instances i ON t.instance_id = i.id
+             JOIN planner_configs c ON t.config_id = c.id
+        WHERE c.domain = ? AND c.planner = ? AND t.outcome = 'solved'
+        ORDER BY t.id""", (domain, planner))
+    with open(path, "w") as f:
+        f.write(header + "\n")
+        for row in rows:
+            size, params, time, states_explored, plan_length = [_EmptyField() if x is None else x for x in row]
+            params = json.loads(params)
+            f.write(row_format.format(size=size, time=time, states_explored=states_explored,
+                                      plan_length=plan_length, p=params.get("sat_params", [])) + "\n")
+
+
+def merge_stores(target_path, *source_paths):
+    """
+    Copy every run in the stores at source_paths, with its trials, instances,
+    configurations and host, into the store at target_path. A run that is
+    already in the target (same start time, code version, command, seed and
+    host) is skipped, so merging the same store twice does no harm.
+    """
+    target = connect(target_path)
+    for source_path in source_paths:
+        source = connect(source_path)
+        source.row_factory = sqlite3.Row
+        with target:
+            ids = {table: {} for table in ["hosts", "planner_configs", "instances", "runs"]}
+            for table in ["hosts", "planner_configs", "instances"]:
+                for row in source.execute(f"SELECT * FROM {table}"):
+                    values = {k: row[k] for k in row.keys() if k != "id"}
+                    ids[table][row["id"]] = _get_or_insert(target, table, values)
+            for row in source.execute("SELECT * FROM runs"):
+                values = {k: row[k] for k in row.keys() if k != "id"}
+                values["host_id"] = ids["hosts"].get(values["host_id"])
+                where = " AND ".join(f"{c} IS ?" for c in values)
+                if target.execute(f"SELECT id FROM runs WHERE {where}", list(values.values())).fetchone():
+                    continue
+                ids["runs"][row["id"]] = _get_or_insert(target, "runs", values)
+            trials = []
+            for row in source.execute("SELECT * FROM trials ORDER BY id"):
+                if row["run_id"] in ids["runs"]:
+                    trials.append([ids["runs"][row["run_id"]], ids["instances"][row["instance_id"]],
+                                   ids["planner_configs"][row["config_id"]]] + [row[f] for f in TRIAL_FIELDS])
+            target.executemany(
+                f"INSERT INTO trials (run_id, instance_id, config_id, {', '.join(TRIAL_FIELDS)}) "
+                f"VALUES ({', '.join('?' * (len(TRIAL_FIELDS) + 3))})", trials)
+        source.close()
+    target.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query and export the experiment results store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write trials in the legacy CSV layout")
+    export_parser.add_argument("store")
+    export_parser.add_argument("domain", help="block or sat")
+    export_parser.add_argument("planner", help="htn or domain_independent")
+    export_parser.add_argument("csv_file")
+    median_parser = subparsers.add_parser("median", help="Print the median time for each size")
+    median_parser.add_argument("store")
+    median_parser.add_argument("domain", help="block or sat")
+    median_parser.add_argument("planner", help="htn or domain_independent")
+    median_parser.add_argument("--code_version", default=None)
+    median_parser.add_argument("--config_id", type=int, default=None, help="Only this planner configuration (see configs)")
+    paired_parser = subparsers.add_parser("paired", help="Print HTN and Metric-FF times on the same instances")
+    paired_parser.add_argument("store")
+    paired_parser.add_argument("domain", help="block or sat")
+    paired_parser.add_argument("--config_a", type=int, default=None, help="Only this HTN configuration (see configs)")
+    paired_parser.add_argument("--config_b", type=int, default=None, help="Only this Metric-FF configuration (see configs)")
+    configs_parser = subparsers.add_parser("configs", help="List the planner configurations and their ids")
+    configs_parser.add_argument("store")
+    merge_parser = subparsers.add_parser("merge", help="Combine several stores into one")
+    merge_parser.add_argument("store", help="The store to merge into (created if necessary)")
+    merge_parser.add_argument("sources", nargs="+", help="The stores to copy from")
+    cli_args = parser.parse_args()
+
+    if cli_args.command == "merge":
+        merge_stores(cli_args.store, *cli_args.sources)
+        sys.exit(0)
+    connection = connect(cli_args.store)
+    if cli_args.command == "export":
+        export_csv(connection, cli_args.domain, cli_args.planner, cli_args.csv_file)
+    elif cli_args.command == "paired":
+        print("Size, Seed, HTN Time, Domain Independent Time")
+        for size, seed, htn_time, ff_time in paired_times(connection, cli_args.domain,
+                                                          config_a=cli_args.config_a, config_b=cli_args.config_b):
+            print(f"{size}, {seed}, {htn_time}, {ff_time}")
+    elif cli_args.command == "configs":
+        for config_id, planner, domain, options in planner_configs(connection):
+            print(f"{config_id}, {planner}, {domain}, {options}")
+    else:
+        for size, median, count in median_time_by_size(connection, cli_args.domain, cli_args.planner,
+                                                       cli_args.code_version, cli_args.config_id):
+            print(f"{size}, {median}, {count}")
+    connection.close()
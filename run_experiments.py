@@ -1,9 +1,16 @@
 import argparse
+import atexit
+import hashlib
+import json
 import os
-import random
 import sys
-import timeit
 import re
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import benchmark
+import metric_ff
+import problem_corpus
+import results_store
 sys.path.append('./GTPyhop')
 import gtpyhop as gtpyhop
 sys.setrecursionlimit(5000)
@@ -14,8 +21,29 @@ parser.add_argument('planner', help="Choose either htn or domain_independent")
 parser.add_argument('repeats', help="Number of times each experiment will be repeated", type=int)
 parser.add_argument('schedule',  nargs="+", help="The trial sizes, as an array", type=int)
 parser.add_argument('--seed', type=int, default=10)
-parser.add_argument('--sat_params', nargs="+", help="The extra parameters used in the Satellite domain: num_satellites, num_modes, num_instruments, num_observations", default= [10, 5, 10, 2])
+parser.add_argument('--sat_params', nargs="+", type=int, help="The extra parameters used in the Satellite domain: num_satellites, num_modes, num_instruments, num_observations", default= [10, 5, 10, 2])
+parser.add_argument('--ff_timeout', type=float, default=None, help="Wall-clock limit in seconds for each Metric-FF run")
+parser.add_argument('--ff_memory', type=int, default=None, help="Memory limit in MB for each Metric-FF run")
+parser.add_argument('--jobs', type=int, default=1, help="Number of Metric-FF runs to execute in parallel")
+parser.add_argument('--results', default=results_store.DEFAULT_PATH, help="The SQLite results store that trials are written to")
+parser.add_argument('--rerun', action='store_true', help="Run every trial, even those already in the results store")
+parser.add_argument('--shard', default="0/1", help="Run only shard i of N of the trials, given as i/N")
+parser.add_argument('--warmup', type=int, default=1, help="Untimed HTN planning runs before the timed ones, per instance")
+parser.add_argument('--timing_repeats', type=int, default=3, help="Timed HTN planning runs per instance; the median is recorded")
+parser.add_argument('--no_memory', action='store_true', help="Don't measure the peak memory of HTN planning with tracemalloc")
+parser.add_argument('--corpus', default=problem_corpus.DEFAULT_PATH, help="Directory of the problem corpus shared by all planners and runs")
+parser.add_argument('--method_stats', default=None, help="A file saved by gtpyhop.MethodStats to order the HTN methods by; it is used frozen, so every run tries them in the same order")
+parser.add_argument('--learn_method_stats', default=None, help="A gtpyhop.MethodStats file that the HTN planner orders its methods by and updates as it plans; it is created if it doesn't exist and saved when the run exits")
+parser.add_argument('--method_cache', type=int, default=None, help="Size of a gtpyhop.MethodCache for the HTN methods with declared read-sets; it is emptied before each planning run, so every run starts cold")
 args = parser.parse_args()
+if args.method_stats is not None and args.learn_method_stats is not None:
+    parser.error("--method_stats and --learn_method_stats can't be used together")
+if args.method_stats is not None and not os.path.exists(args.method_stats):
+    parser.error(f"--method_stats file {args.method_stats} doesn't exist")
+
+# Version of the pickled HTN (state, goal) in the problem corpus; bump it when
+# parse_block_problem_htn or parse_sat_problem_htn changes what it builds.
+NATIVE_VERSION = 2
 ##print(args.domain, args.planner, args.repeats, args.schedule, args.sat_params)
 
 """Begin Methods for Domain Independent Planner"""
@@ -37,14 +65,50 @@ def parse_block_line(str, add_state_vars = False, n = 0):
         output += "(handempty)"
     return output
 
-def create_block_problem(n, cur_repeat):
+def trial_hash(*key):
+    """A stable integer hash of a trial's identifying values"""
+    return int(hashlib.sha256(repr(key).encode()).hexdigest()[:16], 16)
+
+def file_hash(path):
+    """A short hash of the contents of the file at path"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def trial_seed(n, repeat):
+    """
+    The generator seed for repeat number 'repeat' at size n. It depends only on the
+    master seed, domain, size and repeat, so it doesn't change when the schedule does.
+    """
+    return trial_hash(args.seed, args.domain, n, repeat) % 10000000 / 100
+
+def schedule_trials(config_id):
+    """
+    Yields (n, repeat, seed) for each trial of the schedule that belongs to this shard
+    and, unless --rerun was given, isn't already in the results store for config_id.
+    """
+    shard, num_shards = [int(x) for x in args.shard.split("/")]
+    completed = set() if args.rerun else store.completed_trials(config_id)
+    for n in args.schedule:
+        for repeat in range(1,args.repeats+1):
+            seed = trial_seed(n, repeat)
+            if trial_hash("shard", args.seed, args.domain, n, repeat) % num_shards != shard:
+                continue
+            if (n, json.dumps(generator_params(n), sort_keys=True), seed, repeat) in completed:
+                print(f"Skipping completed trial: {args.domain} {args.planner} size {n} repeat {repeat}")
+                continue
+            yield n, repeat, seed
+
+def generator_params(n):
+    """The generator parameters that, with the size and seed, identify an instance"""
+    if args.domain == "block":
+        return {"n": n}
+    return {"sat_params": args.sat_params}
+
+def create_block_problem(n, gen_text, seed):
     """Converts the generated block problem into a PDDL problem"""
     #Add preliminaries  
     output = ""
-    seed = random.random() * 100000
-    stream = os.popen(f"./bwstates_src/bwstates -n {n} -r {seed}")
-    gen_text = stream.readlines()
-    output += f"(define (problem BW-{n}-{cur_repeat+1})\n"
+    output += f"(define (problem BW-{n}-{int(seed*100)})\n"
     output += f"(:domain blocks)\n"
     output += "(:objects"
     #Add block objects
@@ -58,8 +122,7 @@ def create_block_problem(n, cur_repeat):
     output += parse_block_line(gen_text[3][:-1]) + ")\n)\n)"
     return(output)
 
-def create_sat_problem(n):
-    seed = random.random() * 100000
+def create_sat_problem(n, seed):
     if args.sat_params is not None:
         max_instuments = args.sat_params[2]
         num_satellites = args.sat_params[0]
@@ -71,49 +134,123 @@ def create_sat_problem(n):
         stream = os.popen(f"./satellite-generator/satgen -n {seed} {n} {n} {n} {n} {n}")
     return stream.read()
 
-def write_current_problem(problem):
-    f = open("current_problem.pddl", "w")
-    f.write(problem)
-    f.close()
-
-def run_domain_independent_experiment(command, log_file,n, add_sat_params = False):
-    #Send request to terminal
-    stream = os.popen(command)
-    #Process results to file
-    results = stream.readlines()
-    #print(results[-2])
-    f = open(log_file, "a")
-    if args.domain == "block" :
-        f.write(f"\n{n}, {results[-2].split()[0]}, {results[-2].split()[1]}, {results[-3].split()[4]}, {int(results[-11].split()[0][:-1]) +1}")
-    else :
-        f.write(f"\n{n}, {results[-2].split()[0]}, {results[-2].split()[1]}, {results[-3].split()[4]}, {int(results[-11].split()[0][:-1]) +1}, "+ 
-        f"{args.sat_params[0]}, {args.sat_params[1]}, {args.sat_params[2]}, {args.sat_params[3]}")
-    f.close()
+def run_domain_independent_experiment(domain_file, options, problem):
+    """Runs Metric-FF on one problem with the configured time and memory limits"""
+    return metric_ff.run_ff(domain_file, problem, options, timeout=args.ff_timeout, memory_limit=args.ff_memory)
+
+def record_domain_independent_result(ff_run, config_id, instance_id, repeat):
+    """Adds a Metric-FF run, whatever its outcome, to the results store"""
+    result = metric_ff.ff_result(ff_run)
+    details = result._asdict()
+    del details["plan"]
+    store.add_trial(instance_id, config_id, repeat=repeat, outcome=result.outcome, time=result.total_time,
+                    wall_time=result.wall_time, search_time=result.search_time, preprocessing_time=result.preprocessing_time,
+                    states_explored=result.states_evaluated, plan_length=result.plan_length, details=details)
+
+def generator_name():
+    return "bwstates" if args.domain == "block" else "satgen"
+
+def build_problem(n, seed, phases):
+    """Generates an instance and returns its PDDL text and its (state, goal) for the HTN planner"""
+    if args.domain == "block":
+        with benchmark.timed(phases, 'generation'):
+            stream = os.popen(f"./bwstates_src/bwstates -n {n} -r {seed}")
+            gen_text = stream.readlines()
+        with benchmark.timed(phases, 'parsing'):
+            return create_block_problem(n, gen_text, seed), parse_block_problem_htn(n, gen_text)
+    with benchmark.timed(phases, 'generation'):
+        problem = create_sat_problem(n, seed)
+    with benchmark.timed(phases, 'parsing'):
+        return problem, parse_sat_problem_htn(problem)
+
+def get_problem(n, seed, form, phases):
+    """
+    Returns the PDDL or native (state, goal) form of an instance from the problem corpus,
+    generating it only if no earlier trial (of either planner) has done so.
+    """
+    with benchmark.timed(phases, 'corpus_lookup'):
+        return corpus.get(generator_name(), n, generator_params(n), seed, lambda: build_problem(n, seed, phases), form)
+
+def run_domain_independent_schedule(domain_file, options):
+    """
+    Generates the problems for the scheduled trials, then runs Metric-FF on them,
+    args.jobs at a time. Results are recorded in schedule order.
+    """
+    config_id = store.config_id("domain_independent", args.domain, {"domain_file": domain_file, "options": options,
+                                "timeout": args.ff_timeout, "memory_limit": args.ff_memory})
+    trials = []
+    for n, repeat, seed in schedule_trials(config_id):
+        instance_id = store.instance_id(args.domain, generator_name(), n, generator_params(n), seed)
+        trials.append((instance_id, repeat, get_problem(n, seed, problem_corpus.PDDL, {})))
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        ff_runs = pool.map(lambda trial: run_domain_independent_experiment(domain_file, options, trial[2]), trials)
+        for (instance_id, repeat, _), ff_run in zip(trials, ff_runs):
+            record_domain_independent_result(ff_run, config_id, instance_id, repeat)
+
+def htn_config_id():
+    """The results store's id for the HTN planner with this run's settings"""
+    options = {"verify_goals": gtpyhop.verify_goals, "warmup": args.warmup, "timing_repeats": args.timing_repeats}
+    if args.method_cache is not None:
+        options["method_cache"] = args.method_cache
+    if args.method_stats is not None:
+        # the file's contents decide the method order, so a changed file is a different config
+        options["method_stats"] = [args.method_stats, file_hash(args.method_stats)]
+    if args.learn_method_stats is not None:
+        options["learn_method_stats"] = args.learn_method_stats
+    return store.config_id("htn", args.domain, options)
+
+def record_htn_result(n, repeat, seed, result, phases, cache_counts):
+    """
+    Adds an HTN trial to the results store. Its time is the median of the timed planning runs;
+    every planning time, the other phases, the peak memory and the method cache's hits and
+    misses in one planning run (if there is a cache) are kept in the details.
+    """
+    config_id = htn_config_id()
+    instance_id = store.instance_id(args.domain, generator_name(), n, generator_params(n), seed)
+    time = statistics.median(result['times'])
+    details = {f"{phase}_time": t for phase, t in phases.items()}
+    details.update(domain_setup_time=domain_setup_time, planning_times=result['times'], peak_memory=result['peak_memory'])
+    details.update(cache_counts)
+    plan = result['plan']
+    if plan == False or plan == None:
+        store.add_trial(instance_id, config_id, repeat=repeat, outcome="failed", time=time, details=details)
+    else:
+        store.add_trial(instance_id, config_id, repeat=repeat, outcome="solved", time=time,
+                        search_time=time, plan_length=len(plan), details=details)
+
+def run_htn_trial(n, repeat, seed):
+    """Times planning for an instance from the corpus, with tracing off, and records the trial"""
+    phases = {}
+    state, goal = get_problem(n, seed, problem_corpus.NATIVE, phases)
+    state.display('Initial state is')
+    goal.display()
+    cache = gtpyhop.method_cache
+    if cache is not None:
+        # so that the cache's lookups take constant time
+        state.track_hash()
+    result = benchmark.time_planning(state, [('achieve', goal)], args.warmup, args.timing_repeats,
+                                     measure_memory=not args.no_memory,
+                                     before_each=cache.clear if cache is not None else None)
+    cache_counts = {}
+    if cache is not None:
+        # the counts are from the last run, which started with an empty cache like the others
+        cache_counts = {"method_cache_hits": cache.hits, "method_cache_misses": cache.misses}
+    record_htn_result(n, repeat, seed, result, phases, cache_counts)
 
 """"Begin Methods for HTN Planner"""""
-def run_block_problem_htn(n, current_repeat):
-    seed = random.random() * 100000
-    stream = os.popen(f"./bwstates_src/bwstates -n {n} -r {seed}")
-    gen_text = stream.readlines()
-    #print(gen_text)
+def parse_block_problem_htn(n, gen_text):
+    """Builds the initial state and goal from the output of bwstates"""
     state = gtpyhop.State('state')
     state.pos = {i+1:int(p) if int(p) > 0 else 'table'  for  i, p in enumerate(gen_text[1].split())}
     state.clear={i+1: True for i in range(n)}
     state.clear.update({int(i):False for i in gen_text[1].split()})
     del state.clear[0]
     state.holding={'hand':False}
-    state.display('Initial state is')
+    state.above={i+1: False for i in range(n)}
+    state.above.update({p: b for b, p in state.pos.items() if p != 'table'})
     goal = gtpyhop.Multigoal('goal')
     goal.pos={i+1:int(p) if int(p) > 0 else 'table'  for  i, p in enumerate(gen_text[3].split())}
-    goal.display()
-    start_time = timeit.default_timer()
-    gtpyhop.verbose = 3
-    plan = gtpyhop.find_plan(state, [('achieve', goal)])
-    time = timeit.default_timer() - start_time
-    length = len(plan)
-    f = open("results_data/block_htn.csv", "a")
-    f.write(f"{n}, {time}, {length}\n")
-    f.close()
+    return state, goal
 
 
     
@@ -131,9 +268,8 @@ def run_htn_block_experiment():
     import GTPyhop.Examples.blocks_htn.actions
     gtpyhop.find_plan(state2,[('achieve',goal2a)])
 
-def run_sat_problem_htn(n):
-    problem = create_sat_problem(n)
-    print(problem)
+def parse_sat_problem_htn(problem):
+    """Builds the initial state and goal from a satgen PDDL problem"""
     state = gtpyhop.State('state')
     #Create starting state
     s_0_text = problem[problem.find(":init") : problem.find(")\n(:goal")]
@@ -198,45 +334,42 @@ def run_sat_problem_htn(n):
     pattern = re.compile("have_image\s\w+\s\w+")
     goal.have_image = [(x.split()[1],x.split()[2]) for x in pattern.findall(g_text)]
     #print(goal.have_image)
-
-    #Run Experiment
-    start_time = timeit.default_timer()
-    gtpyhop.verbose = 3
-    plan = gtpyhop.find_plan(state, [('achieve', goal)])
-    time = timeit.default_timer() - start_time
-    length = len(plan)
-    f = open("results_data/sat_htn.csv", "a")
-    f.write(f"{n}, {time}, {length}, {args.sat_params[0]}, {args.sat_params[1]}, {args.sat_params[2]}, {args.sat_params[3]}\n")
-    f.close()
+    return state, goal
 
 
 #Start Experiments
-random.seed(args.seed)
+store = results_store.ResultsStore(args.results, args.seed)
+corpus = problem_corpus.ProblemCorpus(args.corpus, NATIVE_VERSION)
 #run Domain Independent Problems
 if args.planner == "domain_independent":
     #Block Problems
     if args.domain == "block":
-        for n in args.schedule: 
-            for repeat in range(1,args.repeats+1):
-                write_current_problem(create_block_problem(n,repeat))
-                run_domain_independent_experiment("Metric-FF/ff -o BLKDomain.pddl -f current_problem.pddl -E -g 1 -h 4", "results_data/block_ind.csv", n)
+        run_domain_independent_schedule("BLKDomain.pddl", ["-E", "-g", "1", "-h", "4"])
     #Satellite Problems
     else:
-        for n in args.schedule: 
-            for repeat in range(1,args.repeats+1):
-                write_current_problem(create_sat_problem(n))
-                run_domain_independent_experiment("Metric-FF/ff -o SATDomain.pddl -f current_problem.pddl -E -g 1 -h 5", "results_data/sat_ind.csv", n)
+        run_domain_independent_schedule("SATDomain.pddl", ["-E", "-g", "1", "-h", "5"])
 #HTN Problems
 else :
+    setup = {}
+    if args.method_stats is not None:
+        gtpyhop.method_stats = gtpyhop.MethodStats(args.method_stats, frozen=True)
+    if args.learn_method_stats is not None:
+        gtpyhop.method_stats = gtpyhop.MethodStats(args.learn_method_stats)
+        atexit.register(gtpyhop.method_stats.save)
+    if args.method_cache is not None:
+        gtpyhop.method_cache = gtpyhop.MethodCache(args.method_cache)
     #Block Problems
     if args.domain == "block":
-        init_htn_blocks()
-        for n in args.schedule: 
-            for repeat in range(1,args.repeats+1):
-                run_block_problem_htn(n, repeat)
+        with benchmark.timed(setup, 'domain_setup'):
+            init_htn_blocks()
+        domain_setup_time = setup['domain_setup']
+        for n, repeat, seed in schedule_trials(htn_config_id()):
+            run_htn_trial(n, repeat, seed)
     #Satellite Problems
     else:
-        init_htn_sat()
-        for n in args.schedule: 
-            for repeat in range(1,args.repeats+1):
-                run_sat_problem_htn(n)
\ No newline at end of file
+        with benchmark.timed(setup, 'domain_setup'):
+            init_htn_sat()
+        domain_setup_time = setup['domain_setup']
+        for n, repeat, seed in schedule_trials(htn_config_id()):
+            run_htn_trial(n, repeat, seed)
+store.close()
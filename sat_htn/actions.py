@@ -68,3 +68,12 @@ def take_image(s, satellite, direction, instrument, mode):
 # Tell Pyhop what the actions are
 #
 gtpyhop.declare_actions(turn_to, switch_on, switch_off, calibrate, take_image)
+
+# The cost of a plan, for find_plan_anytime, is the fuel it uses
+#
+def turn_to_cost(s, sat, d_new, d_prev):
+    return s.slew_time[(d_new, d_prev)]
+
+gtpyhop.declare_action_cost('turn_to', turn_to_cost)
+for action_name in ['switch_on', 'switch_off', 'calibrate', 'take_image']:
+    gtpyhop.declare_action_cost(action_name, 0)
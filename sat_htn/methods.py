@@ -183,11 +183,20 @@ def m_go_take_image(state, satellite, direction, instrument, mode):
 
 ##############################################################################################
 ### Methods specifically for choose_next_image. This is where all of the backtracking is done
-def m_choose_cheapest_sat_1(state):
-    """chooses to complete the cheapest possible objective"""
-    best_cost = min(state.costs[state.best_satellite].keys())
-    img_dir, img_mode, instrument  = state.costs[state.best_satellite][best_cost][0]
-    return [('hunt_image', state.best_satellite, img_dir, instrument, img_mode)]
+def m_choose_by_cost(state):
+    """
+    Yields every objective that some satellite can complete, cheapest first,
+    so backtracking can try all of them. Ties go to the earlier satellite,
+    so the first choice is the cheapest objective of state.best_satellite.
+    """
+    options = []
+    for sat_index, satellite in enumerate(state.satellites):
+        for cost, objectives in state.costs[satellite].items():
+            for obj_index, (img_dir, img_mode, instrument) in enumerate(objectives):
+                options.append((cost, sat_index, obj_index, satellite, img_dir, img_mode, instrument))
+    options.sort(key=lambda option: option[:3])
+    for _, _, _, satellite, img_dir, img_mode, instrument in options:
+        yield [('hunt_image', satellite, img_dir, instrument, img_mode)]
 
 def m_choose_last_chance(state):
     """
@@ -210,5 +219,28 @@ def m_choose_last_chance(state):
 gtpyhop.declare_task_methods('achieve', m_disbatch)
 gtpyhop.declare_task_methods('final_move', m_move_satellites_to_final_position)        
 gtpyhop.declare_task_methods('move', m_move)
-gtpyhop.declare_task_methods('choose_next_image', m_choose_last_chance, m_choose_cheapest_sat_1 )
-gtpyhop.declare_task_methods('hunt_image', m_go_take_image)
\ No newline at end of file
+gtpyhop.declare_task_methods('choose_next_image', m_choose_last_chance, m_choose_by_cost)
+gtpyhop.declare_task_methods('hunt_image', m_go_take_image)
+gtpyhop.declare_method_reads(m_move, 'pointing')
+gtpyhop.declare_method_reads(m_go_take_image, 'current_powered_instrument', 'calibrated',
+                             'power_on', 'calibration_target')
+##############################################################################################
+### Heuristic for find_plan_best_first
+
+def h_fuel_for_images(state, todo_list):
+    """
+    The most fuel that any of the images still needed by an 'achieve' task in todo_list
+    would take, if the cheapest satellite took it from the current state. Slew times
+    don't always obey the triangle inequality, so this can overestimate the fuel that
+    is left to use (a satellite may get to an image for less by taking another first).
+    """
+    most = 0
+    for item in todo_list:
+        if isinstance(item, tuple) and item[0] == 'achieve':
+            for direction, mode in images_still_needed(state, item[1]):
+                options = [calculate_cost_to_acquire_image(state, satellite, direction, mode)
+                           for satellite in state.satellites]
+                most = max(most, safe_min([option[0] for option in options if option]))
+    return most
+
+gtpyhop.declare_heuristic(h_fuel_for_images)